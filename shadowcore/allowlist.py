@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+ShadowCore allowlist - known-good IOCs suppressed before analysis
+
+Loads local known-good lists from /opt/shadowcore/feeds/allowlist/:
+
+  top_domains/   ranked popularity lists ("rank,domain" CSV, e.g. Tranco);
+                 only the top N rows are loaded
+  cloud/         cloud provider and CDN ranges, one CIDR per line
+  infra/         our own infrastructure: domains, IPs or CIDRs
+
+Every file is plain text with one entry per line ('#' comments allowed).
+Curated entries (cloud/, infra/) go into the shared IOC structures: a
+domain trie for suffix matches and a CIDR set for ranges. Popularity
+lists only match their exact domain, and only for a bare host IOC: they
+include shared-hosting and dynamic-DNS parents (github.io, duckdns.org)
+whose subdomains anyone can register, and a popular host says nothing
+about one URL on it.
+"""
+import glob
+import os
+from urllib.parse import urlsplit
+
+from ioc_index import CIDRSet, DomainTrie
+
+ALLOWLIST_DIR = "/opt/shadowcore/feeds/allowlist"
+DEFAULT_TOP_N = 10000
+
+# Always benign, even with no allowlist files on disk
+BUILTIN_NETWORKS = {
+    'private': ['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8', '169.254.0.0/16'],
+    'public_dns': ['8.8.8.8', '8.8.4.4', '1.1.1.1', '1.0.0.1', '9.9.9.9'],
+}
+
+
+class Allowlist:
+    """Known-good domains, IPs and networks"""
+
+    def __init__(self, allowlist_dir=ALLOWLIST_DIR, top_n=DEFAULT_TOP_N):
+        self.allowlist_dir = allowlist_dir
+        self.top_n = top_n
+        self.domains = DomainTrie()
+        self.networks = CIDRSet()
+        self.top_domains = {}
+        self.sources = {}
+
+        for category, networks in BUILTIN_NETWORKS.items():
+            for network in networks:
+                self.networks.add(network, category)
+        for category, entry in self._iter_entries():
+            self._add(category, entry)
+
+    def _iter_entries(self):
+        """Yield (category, entry) from every allowlist file"""
+        for path in sorted(glob.glob(os.path.join(self.allowlist_dir, '*', '*'))):
+            category = os.path.basename(os.path.dirname(path))
+            limit = self.top_n if category == 'top_domains' else None
+            loaded = 0
+            try:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        line = line.split('#', 1)[0].strip()
+                        if not line:
+                            continue
+                        # Ranked CSVs carry the domain in the last column
+                        entry = line.split(',')[-1].strip()
+                        if entry:
+                            yield category, entry
+                            loaded += 1
+                        if limit and loaded >= limit:
+                            break
+            except OSError as e:
+                print(f"  ⚠️  Allowlist file skipped: {path} ({e})")
+                continue
+            self.sources[os.path.relpath(path, self.allowlist_dir)] = loaded
+
+    def _add(self, category, entry):
+        """Route an entry to the right structure"""
+        entry = entry.lower().rstrip('.')
+        if self.networks.add(entry, category):
+            return
+        if category == 'top_domains':
+            self.top_domains.setdefault(entry, category)
+        else:
+            self.domains.add(entry, category)
+
+    @staticmethod
+    def _host(ioc):
+        """Reduce URLs to their host (malformed URLs stay as they are)"""
+        if '://' in ioc:
+            try:
+                return urlsplit(ioc).hostname or ioc
+            except ValueError:
+                return ioc
+        return ioc
+
+    def match(self, ioc):
+        """Category of the allowlist entry covering ioc, or None"""
+        ioc = ioc.strip().lower()
+        host = self._host(ioc)
+        if host[:1].isdigit() or ':' in host:
+            category = self.networks.match(host)
+            if category:
+                return category
+        if '.' not in host:
+            return None
+        category = self.domains.match(host)
+        if category is None and host == ioc:
+            category = self.top_domains.get(host.rstrip('.'))
+        return category
+
+    def __contains__(self, ioc):
+        return self.match(ioc) is not None
+
+    def stats(self):
+        """Sizes of the compiled structures"""
+        return {
+            'domains': len(self.domains),
+            'networks': len(self.networks),
+            'top_domains': len(self.top_domains),
+            'sources': self.sources,
+        }
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+ShadowCore batch analysis - stream IOCs through one orchestrator
+
+Reads IOCs (one per line) from a file or stdin, keeps N analyses in flight
+and writes one JSON report per line (NDJSON) as each finishes. Memory stays
+bounded by the concurrency, so million-line files run in a single process.
+
+Usage:
+    python3 batch_analyze.py iocs.txt -c 32 -o reports.ndjson
+    cat iocs.txt | python3 batch_analyze.py - --summary-only
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tracing import start_metrics_server, tracer
+
+
+async def read_lines(f, chunk_bytes=1 << 16):
+    """Read lines in chunks off the event loop so a slow pipe doesn't stall analyses"""
+    loop = asyncio.get_running_loop()
+    while True:
+        lines = await loop.run_in_executor(None, f.readlines, chunk_bytes)
+        if not lines:
+            return
+        for line in lines:
+            yield line
+
+
+async def run_batch(args, out):
+    """Drive process_iocs over the input and stream reports to out"""
+    from clean_orchestrator_fixed import CleanShadowCoreOrchestrator
+
+    orchestrator = CleanShadowCoreOrchestrator()
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', errors='replace')
+    counts = {'high': 0, 'medium': 0, 'low': 0, 'error': 0}
+    total = 0
+    started = time.time()
+
+    try:
+        async for report in orchestrator.process_iocs(read_lines(source), concurrency=args.concurrency):
+            total += 1
+            if 'error' in report:
+                counts['error'] += 1
+            else:
+                level = report['threat_assessment']['level']
+                counts[level] = counts.get(level, 0) + 1
+            if not args.summary_only:
+                out.write(json.dumps(report) + '\n')
+            if args.progress and total % args.progress == 0:
+                rate = total / max(time.time() - started, 1e-9)
+                print(f"  ... {total} IOCs ({rate:.0f}/s)", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        await orchestrator.close()
+
+    elapsed = time.time() - started
+    return {
+        'total_iocs': total,
+        'threat_distribution': counts,
+        'elapsed_seconds': round(elapsed, 2),
+        'iocs_per_second': round(total / elapsed, 1) if elapsed else 0.0,
+        'concurrency': args.concurrency,
+        'coalescing': orchestrator.flights.snapshot(),
+        'latency': tracer.summary()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ShadowCore streaming batch IOC analysis')
+    parser.add_argument('input', help="IOC file, one per line ('-' for stdin)")
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='Analyses in flight (default 16)')
+    parser.add_argument('-o', '--output', default='-', help="NDJSON output file ('-' for stdout)")
+    parser.add_argument('--summary-only', action='store_true', help='Only print the final summary')
+    parser.add_argument('--progress', type=int, default=10000, help='Progress line every N IOCs (0 = off)')
+    parser.add_argument('--metrics-port', type=int, default=0, help='Serve Prometheus /metrics on this port')
+    parser.add_argument('--verbose', action='store_true', help='Keep per-IOC orchestrator output (on stderr)')
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    # Per-IOC orchestrator chatter must not interleave with the NDJSON stream
+    chatter = sys.stderr if args.verbose else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(chatter):
+            summary = asyncio.run(run_batch(args, out))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+ShadowCore end-to-end throughput benchmark
+
+Drives CleanShadowCoreOrchestrator.process_ioc against local stand-ins for
+every dependency (dependency_stubs.py) and prints one JSON document for
+regression tracking:
+
+  single      one IOC at a time - per-IOC latency with no contention
+  concurrent  --concurrency process_ioc calls in flight at once
+  batch       process_iocs (streaming, bounded in-flight window)
+
+Each mode gets fresh Redis/graph stand-ins and a fresh orchestrator over
+the same threat cache and allowlist, and reports p50/p95/p99/max latency
+(exact, in ms), IOCs/s, errors and RSS. The workload mixes known threats
+(--known), unseen IPs/domains and repeats of earlier IOCs (--repeat, which
+exercise single-flight and the analysis cache).
+
+Usage:
+    python3 bench_orchestrator.py --iocs 2000 --profile standard
+    python3 bench_orchestrator.py --dep redis=0.5 --dep graph=3:0.01 --dep http=20 \\
+        --profile deep --modes concurrent batch --output bench.json
+
+Dependency faults are NAME=LATENCY_MS[:FAIL_RATE[:JITTER_MS]] for redis,
+graph, http and ollama (ollama latency is per streamed token).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+
+from dependency_stubs import DependencyStubs, Fault, parse_faults
+
+MODES = ('single', 'concurrent', 'batch')
+DEFAULT_FAULTS = {
+    'redis': Fault(0.2),
+    'graph': Fault(2.0),
+    'http': Fault(10.0),
+    'ollama': Fault(1.0),
+}
+
+
+def rss_mb():
+    """Current resident set size (MB)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def latency_summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+    }
+
+
+def synthetic_threats(n, seed=7):
+    """Threat-cache entries for when no feed cache is installed"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    malware = ('Emotet', 'QakBot', 'Dridex', 'TrickBot', 'IcedID', None)
+    entries = {}
+    while len(entries) < n:
+        if rng.random() < 0.7:
+            ioc = f"{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            kind = 'c2_server'
+        else:
+            ioc = f"{rng.choice(('cdn', 'upd', 'login', 'mail'))}{rng.randint(0, 10 ** 6)}.{rng.choice(('top', 'xyz', 'ru', 'net'))}"
+            kind = 'malicious_domain'
+        entries[ioc] = {'type': kind, 'source': 'synthetic', 'threat_level': 'high',
+                        'timestamp': now, 'malware': rng.choice(malware)}
+    return entries
+
+
+def build_workload(known_iocs, n, known=0.3, repeat=0.2, seed=42):
+    """n IOCs: known threats, unseen IPs/domains and repeats, shuffled"""
+    rng = random.Random(seed)
+    known_iocs = list(known_iocs)
+    iocs = []
+    for _ in range(n):
+        roll = rng.random()
+        if iocs and roll < repeat:
+            iocs.append(rng.choice(iocs))
+        elif known_iocs and roll < repeat + known:
+            iocs.append(rng.choice(known_iocs))
+        elif rng.random() < 0.6:
+            iocs.append(f"{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}")
+        else:
+            iocs.append(f"host{rng.randint(0, 10 ** 7)}.example-{rng.randint(0, 999)}.com")
+    return iocs
+
+
+async def run_single(orchestrator, iocs, profile, concurrency):
+    latencies, errors = [], 0
+    for ioc in iocs:
+        started = time.perf_counter()
+        try:
+            await orchestrator.process_ioc(ioc, profile=profile)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+async def run_concurrent(orchestrator, iocs, profile, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(ioc):
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            try:
+                await orchestrator.process_ioc(ioc, profile=profile)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(ioc) for ioc in iocs))
+    return latencies, errors
+
+
+async def run_batch(orchestrator, iocs, profile, concurrency):
+    from ioc_classifier import normalize_ioc
+
+    # process_iocs pulls the next IOC just before starting it, so the pull
+    # time is the submit time; reports come back keyed by normalized IOC
+    submitted = defaultdict(deque)
+    latencies, errors = [], 0
+
+    def source():
+        for ioc in iocs:
+            submitted[normalize_ioc(ioc)].append(time.perf_counter())
+            yield ioc
+
+    async for report in orchestrator.process_iocs(source(), concurrency=concurrency, profile=profile):
+        finished = time.perf_counter()
+        errors += 'error' in report
+        pending = submitted.get(report.get('ioc'))
+        if pending:
+            latencies.append(finished - pending.popleft())
+    return latencies, errors
+
+
+RUNNERS = {'single': run_single, 'concurrent': run_concurrent, 'batch': run_batch}
+
+
+async def run_mode(mode, args, faults, threat_cache, allowlist, workload, graph_iocs, report_root):
+    from clean_orchestrator_fixed import CleanShadowCoreOrchestrator
+    from report_store import ReportStore
+
+    stubs = DependencyStubs(faults, port_offset=args.port_offset, graph_iocs=graph_iocs)
+    await stubs.start()
+    orchestrator = CleanShadowCoreOrchestrator(
+        threat_cache=threat_cache, allowlist=allowlist, redis=stubs.redis, neo4j_driver=stubs.graph,
+        report_store=ReportStore(os.path.join(report_root, mode))
+    )
+    iocs = workload[:args.single_iocs] if mode == 'single' and args.single_iocs else workload
+    rss_before = rss_mb()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            latencies, errors = await RUNNERS[mode](orchestrator, iocs, args.profile, args.concurrency)
+            elapsed = time.perf_counter() - started
+            drain_started = time.perf_counter()
+            await orchestrator.close()
+            drain = time.perf_counter() - drain_started
+    finally:
+        await stubs.stop()
+    result = {
+        'iocs': len(iocs),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'iocs_per_second': round(len(iocs) / elapsed, 1) if elapsed else 0.0,
+        'latency': latency_summary(latencies),
+        'concurrency': 1 if mode == 'single' else args.concurrency,
+        'persist_drain_seconds': round(drain, 3),
+        'rss_mb': {'before': rss_before, 'after': rss_mb(), 'peak': peak_rss_mb()},
+        'coalesced': orchestrator.flights.snapshot(),
+        'dependencies': stubs.snapshot(),
+    }
+    if orchestrator._writer is not None:
+        result['persistence'] = orchestrator.writer.snapshot()
+    return result
+
+
+async def run_benchmark(args):
+    faults = dict(DEFAULT_FAULTS, **parse_faults(args.dep))
+
+    # clean_orchestrator_fixed / llm_stage read service URLs at import time
+    os.environ['SHADOWCORE_THREAT_INSIGHT_URL'] = f"http://127.0.0.1:{9090 + args.port_offset}"
+    os.environ['SHADOWCORE_OLLAMA_URL'] = f"http://127.0.0.1:{11434 + args.port_offset}"
+    from clean_orchestrator_fixed import PROFILES, CleanShadowCoreOrchestrator
+    from threat_cache import CompactThreatCache
+
+    if args.profile not in PROFILES:
+        raise SystemExit(f"--profile must be one of {', '.join(PROFILES)}")
+    rss_start = rss_mb()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        template = CleanShadowCoreOrchestrator()
+        threat_cache = template.threat_cache
+        synthetic = len(threat_cache) == 0 or args.synthetic
+        if synthetic:
+            threat_cache = CompactThreatCache(synthetic_threats(args.synthetic or 50000))
+        allowlist = template.allowlist
+    rss_loaded = rss_mb()
+
+    known = list(threat_cache)
+    workload = build_workload(known, args.iocs, args.known, args.repeat, args.seed)
+    # A share of the known threats is already in the knowledge graph
+    graph_iocs = known[::max(1, int(1 / args.graph_share))] if args.graph_share else ()
+
+    report = {
+        'benchmark': 'orchestrator',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'profile': args.profile,
+            'iocs': args.iocs,
+            'concurrency': args.concurrency,
+            'known': args.known,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'threat_cache': len(threat_cache),
+            'synthetic_threat_cache': synthetic,
+            'graph_nodes': len(graph_iocs),
+        },
+        'rss_mb': {'start': rss_start, 'data_loaded': rss_loaded},
+        'modes': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='shadowcore-bench-') as report_root:
+        for mode in args.modes:
+            report['modes'][mode] = await run_mode(mode, args, faults, threat_cache, allowlist,
+                                                   workload, graph_iocs, report_root)
+            summary = report['modes'][mode]
+            print(f"  {mode:10} {summary['iocs_per_second']:>9} IOCs/s  "
+                  f"p50 {summary['latency']['p50_ms']} ms  p99 {summary['latency']['p99_ms']} ms  "
+                  f"errors {summary['errors']}", file=sys.stderr)
+    report['rss_mb']['peak'] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ShadowCore orchestrator throughput benchmark')
+    parser.add_argument('--iocs', type=int, default=2000, help='workload size')
+    parser.add_argument('--single-iocs', type=int, default=500, help='IOCs for single mode (0 = all)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--profile', default='standard', help='lookup, standard or deep')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--known', type=float, default=0.3, help='share of known threats')
+    parser.add_argument('--repeat', type=float, default=0.2, help='share of repeated IOCs')
+    parser.add_argument('--graph-share', type=float, default=0.25,
+                        help='share of known threats already in the graph')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='use N synthetic threats (default when no feed cache is installed)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dep', action='append', metavar='NAME=MS[:FAIL[:JITTER]]',
+                        help='dependency fault profile (repeatable)')
+    parser.add_argument('--port-offset', type=int, default=0, help='added to every stub port')
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
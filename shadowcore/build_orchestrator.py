@@ -25,6 +25,9 @@ import aiohttp
 import redis
 from neo4j import GraphDatabase
 
+from ioc_classifier import ioc_type, normalize_ioc
+from vector_index import get_vector_index
+
 class ShadowCoreOrchestrator:
     """Your complete vision: Agent Manager + Worker Pool + AI Engines + OSINT + Memory"""
     
@@ -83,6 +86,7 @@ class ShadowCoreOrchestrator:
     
     async def process_threat_ioc(self, ioc):
         """Complete threat processing pipeline - Your vision in action"""
+        ioc = normalize_ioc(ioc)
         print(f"🚀 Processing IOC: {ioc}")
         print("-"*50)
         
@@ -98,7 +102,7 @@ class ShadowCoreOrchestrator:
         
         # STEP 3: AI ENGINES - Cognitive analysis
         print("3. 🤖 AI Engines: Analyzing patterns...")
-        results["ai_analysis"] = await self._ai_analyze(results["processed"])
+        results["ai_analysis"] = await self._ai_analyze(ioc, results["processed"])
         
         # STEP 4: OSINT ENGINE - Enrich with external intel
         print("4. 📡 OSINT Engine: Enriching with feeds...")
@@ -144,7 +148,7 @@ class ShadowCoreOrchestrator:
             except:
                 # Simulate worker processing
                 if worker == "parser":
-                    results[worker] = {"type": self._detect_ioc_type(ioc), "value": ioc}
+                    results[worker] = {"type": ioc_type(ioc), "value": ioc}
                 elif worker == "crawler":
                     results[worker] = {"related": ["related_ioc_1", "related_ioc_2"]}
                 elif worker == "extractor":
@@ -154,7 +158,7 @@ class ShadowCoreOrchestrator:
         
         return results
     
-    async def _ai_analyze(self, processed_data):
+    async def _ai_analyze(self, ioc, processed_data):
         """AI Engines: Cognitive analysis + embeddings"""
         analysis = {}
         
@@ -175,20 +179,10 @@ class ShadowCoreOrchestrator:
                 "recommendations": ["block", "investigate"]
             }
         
-        # 2. Qdrant similarity search
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ai_engines['qdrant']}/collections/threats/points/search",
-                    json={"vector": self._text_to_vector(str(processed_data)), "limit": 3}
-                ) as response:
-                    if response.status == 200:
-                        analysis["similar"] = await response.json()
-        except:
-            analysis["similar"] = [
-                {"id": "threat_1", "score": 0.92, "info": "Cobalt Strike"},
-                {"id": "threat_2", "score": 0.87, "info": "Emotet"}
-            ]
+        # 2. Similarity search - Qdrant's search API, served by the local index
+        analysis["similar"] = get_vector_index().points_search(
+            {"vector": self._text_to_vector(ioc), "limit": 3}
+        )["result"]
         
         return analysis
     
@@ -212,7 +206,11 @@ class ShadowCoreOrchestrator:
             }
     
     async def _store_intelligence(self, ioc, all_data):
-        """Memory: Store in all memory systems"""
+        """Memory: Store in all memory systems (sync clients, in the executor)"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._store_intelligence_sync, ioc, all_data)
+    
+    def _store_intelligence_sync(self, ioc, all_data):
         stored = {}
         
         # 1. Redis (cache)
@@ -243,7 +241,11 @@ class ShadowCoreOrchestrator:
         return stored
     
     async def _correlate_intelligence(self, ioc):
-        """Memory: Correlate with existing intelligence"""
+        """Memory: Correlate with existing intelligence (sync Neo4j, in the executor)"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._correlate_intelligence_sync, ioc)
+    
+    def _correlate_intelligence_sync(self, ioc):
         correlated = {
             "related_threats": [],
             "campaigns": [],
@@ -288,24 +290,9 @@ class ShadowCoreOrchestrator:
             "report_id": f"report_{int(time.time())}"
         }
     
-    def _detect_ioc_type(self, ioc):
-        """Detect IOC type"""
-        if "." in ioc:
-            parts = ioc.split(".")
-            if len(parts) == 4 and all(p.isdigit() for p in parts):
-                return "ip"
-            return "domain"
-        elif len(ioc) in [32, 40, 64]:
-            return "hash"
-        elif ioc.startswith("http"):
-            return "url"
-        return "unknown"
-    
     def _text_to_vector(self, text):
-        """Convert text to vector (simplified)"""
-        import hashlib
-        hash_val = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
-        return [float((hash_val >> i) & 1) for i in range(128)]
+        """Embed text with the shared feature-hashing embedder"""
+        return get_vector_index().embedder.embed(text)
     
     async def health_check(self):
         """Check health of all components"""
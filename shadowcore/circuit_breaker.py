@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Per-dependency circuit breakers for orchestrator HTTP calls
+
+    from circuit_breaker import CircuitOpenError, breakers
+
+    breaker = breakers.get("shadowbrain")
+    permit = breaker.allow()
+    if not permit:
+        raise CircuitOpenError("shadowbrain")     # microseconds, no socket
+    try:
+        ...call the dependency...
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    finally:
+        breaker.release(permit)
+
+States:
+  closed     calls go through; consecutive failures are counted
+  open       calls are refused until the retry deadline passes
+  half_open  one probe call is let through - success closes the breaker,
+             failure re-opens it with a doubled (capped) retry delay
+
+allow() returns a permit: a unique token for the half-open probe, True
+for an ordinary call. release(permit) frees the probe slot only for the
+probe's own permit, so a call admitted earlier while closed that
+finishes during half-open cannot let a second probe in.
+
+The process-wide `breakers` registry is shared by every orchestrator
+instance and by health checks, so a dependency found down by one request
+or probe is skipped by all concurrent ones.
+"""
+import os
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = int(os.environ.get('SHADOWCORE_BREAKER_FAILURES', '3'))
+RESET_TIMEOUT = float(os.environ.get('SHADOWCORE_BREAKER_RESET', '15'))
+MAX_RESET_TIMEOUT = float(os.environ.get('SHADOWCORE_BREAKER_MAX_RESET', '300'))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name):
+        super().__init__(f"circuit open: {name}")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Failure counter and state machine for one dependency"""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT, max_reset_timeout=MAX_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_delay = reset_timeout
+        self.retry_at = 0.0
+        self.last_error = None
+        self.changed_at = time.time()
+        self.stats = {'calls': 0, 'successes': 0, 'failures': 0, 'short_circuited': 0, 'opened': 0}
+        self._probe = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """A truthy permit if a call may go out now, else False
+
+        When half-open the permit is the probe slot's token; pass it back to
+        release().
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() < self.retry_at:
+                    self.stats['short_circuited'] += 1
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe is not None:
+                    self.stats['short_circuited'] += 1
+                    return False
+                self._probe = object()
+                self.stats['calls'] += 1
+                return self._probe
+            self.stats['calls'] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.stats['successes'] += 1
+            self.failures = 0
+            self.last_error = None
+            if self.state != CLOSED:
+                self.retry_delay = self.reset_timeout
+                self._set_state(CLOSED)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.failures += 1
+            if error is not None:
+                self.last_error = (str(error) or type(error).__name__)[:200]
+            if self.state == HALF_OPEN:
+                # Failed probe - back off further before the next one
+                self.retry_delay = min(self.retry_delay * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release(self, permit=True):
+        """Free the half-open probe slot if permit holds it (call in a finally after allow())"""
+        with self._lock:
+            if permit is not True and permit is self._probe:
+                self._probe = None
+
+    def trip(self, error=None):
+        """Open immediately, e.g. when a health probe finds the dependency down"""
+        with self._lock:
+            if error is not None:
+                self.last_error = str(error)[:200]
+            if self.state != OPEN:
+                self._open()
+
+    def _open(self):
+        self.retry_at = time.monotonic() + self.retry_delay
+        self.stats['opened'] += 1
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.changed_at = time.time()
+            if state != HALF_OPEN:
+                self._probe = None
+
+    def snapshot(self):
+        """JSON-friendly state for health endpoints"""
+        with self._lock:
+            retry_in = max(0.0, self.retry_at - time.monotonic()) if self.state == OPEN else 0.0
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'retry_in_seconds': round(retry_in, 1),
+                'last_error': self.last_error,
+                'since': self.changed_at,
+                **self.stats,
+            }
+
+
+class BreakerRegistry:
+    """Named breakers created on first use"""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name, **self.defaults))
+        return breaker
+
+    def open_names(self):
+        return sorted(name for name, b in self._breakers.items() if b.state != CLOSED)
+
+    def snapshot(self):
+        """{name: state dict} for every dependency seen so far"""
+        return {name: self._breakers[name].snapshot() for name in sorted(self._breakers)}
+
+
+# Process-wide registry shared by the orchestrators and health endpoints
+breakers = BreakerRegistry()
@@ -8,9 +8,11 @@ import asyncio
 import aiohttp
 from datetime import datetime
 import os
-import re
 import sys
 
+from allowlist import Allowlist
+from ioc_classifier import classify_many, ioc_type
+
 print("🧹 CLEAN SHADOWCORE FEED MANAGER")
 print("=" * 50)
 
@@ -39,17 +41,8 @@ class CleanFeedManager:
         os.makedirs('/opt/shadowcore/feeds/clean', exist_ok=True)
     
     def is_valid_ip(self, ip):
-        """Validate IP address"""
-        ip_pattern = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-        if not re.match(ip_pattern, ip):
-            return False
-        
-        # Check each octet
-        parts = ip.split('.')
-        for part in parts:
-            if not 0 <= int(part) <= 255:
-                return False
-        return True
+        """Validate IPv4 address"""
+        return ioc_type(ip) == 'ip'
     
     async def parse_feodo_csv(self, content):
         """Parse Feodo Tracker CSV properly"""
@@ -181,7 +174,11 @@ class CleanFeedManager:
             if result:
                 all_threats.extend(result)
         
-        # Remove duplicates
+        # Canonical values (refanged, lower-cased) so the cache keys match
+        # what the orchestrators look up, then remove duplicates
+        for threat, (value, _) in zip(all_threats, classify_many(t['ioc'] for t in all_threats)):
+            threat['ioc'] = value
+        
         unique_threats = []
         seen_iocs = set()
         for threat in all_threats:
@@ -212,14 +209,17 @@ class CleanFeedManager:
         with open(threats_file) as f:
             data = json.load(f)
         
-        # Create cache dictionary
+        # Create cache dictionary - one shared timestamp per generation
+        generation = datetime.now().isoformat()
+        allowlist = Allowlist()
+        collisions = []
         cache = {}
         for threat in data['threats']:
             cache[threat['ioc']] = {
                 'type': threat['type'],
                 'source': threat.get('source', 'unknown'),
                 'threat_level': 'high',  # All from feeds are high
-                'timestamp': datetime.now().isoformat()
+                'timestamp': generation
             }
             
             # Add extra fields if present
@@ -227,6 +227,12 @@ class CleanFeedManager:
                 cache[threat['ioc']]['malware'] = threat['malware']
             if 'port' in threat:
                 cache[threat['ioc']]['port'] = threat['port']
+            
+            # Flag feed entries that collide with known-good lists
+            allow_category = allowlist.match(threat['ioc'])
+            if allow_category:
+                cache[threat['ioc']]['allowlist_collision'] = allow_category
+                collisions.append(threat['ioc'])
         
         cache_file = "/opt/shadowcore/feeds/clean/threat_cache_clean.json"
         with open(cache_file, 'w') as f:
@@ -234,6 +240,10 @@ class CleanFeedManager:
         
         print(f"📦 Clean cache created: {cache_file}")
         print(f"   {len(cache)} threats ready for real-time lookup")
+        if collisions:
+            print(f"   ⚠️  {len(collisions)} feed entries collide with the allowlist (flagged):")
+            for ioc in collisions[:5]:
+                print(f"      • {ioc} ({cache[ioc]['allowlist_collision']})")
         
         return cache_file
 
@@ -1,13 +1,32 @@
 #!/usr/bin/env python3
+"""
+ShadowCore WebSocket feed on :8083
+
+Message types (client -> server):
+    ping              -> {"type": "pong"} to the sender
+    get_threats       -> {"type": "threat_update", ...} to the sender
+    subscribe_alerts  -> five {"type": "alert"} messages to the sender
+    broadcast         -> {"type": "broadcast", "event": {"type": ..., ...}}
+                         sends `event` (plus a timestamp) to every OTHER
+                         connected client and replies nothing; this is how
+                         publishers such as llm_stage.WebSocketTokenFeed
+                         fan out {"type": "llm_token", ...} events. Slow
+                         clients are skipped rather than waited for.
+    anything else     -> {"type": "echo"} to the sender (debugging)
+"""
 import asyncio, websockets, json, time, logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("WebSocket")
 
+# Every open connection, for broadcast fan-out
+CLIENTS = set()
+
 async def handler(websocket, path):
     """CORRECT handler signature: (websocket, path)"""
     client_ip = websocket.remote_address[0]
     logger.info(f"📡 New connection: {client_ip} on {path}")
+    CLIENTS.add(websocket)
     
     try:
         # Send connection confirmation
@@ -54,6 +73,14 @@ async def handler(websocket, path):
                             "timestamp": time.time()
                         }))
                         await asyncio.sleep(2)
+                elif msg_type == "broadcast":
+                    event = data.get("event")
+                    if isinstance(event, dict) and event.get("type"):
+                        # Fire and forget: never blocks on a slow subscriber
+                        websockets.broadcast(CLIENTS - {websocket},
+                                             json.dumps(dict(event, timestamp=time.time())))
+                    else:
+                        await websocket.send(json.dumps({"type": "error", "message": "broadcast needs an event with a type"}))
                 else:
                     # Echo for debugging
                     await websocket.send(json.dumps({
@@ -69,6 +96,8 @@ async def handler(websocket, path):
         logger.info(f"📴 Disconnected: {client_ip}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
+        CLIENTS.discard(websocket)
 
 async def main():
     """Start WebSocket server"""
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+ShadowCore correlation engine - related IOCs by shared attributes
+
+Keeps inverted indexes from attribute values to the IOCs carrying them:
+
+  malware     malware family              (weight 3.0)
+  registrant  domain registrant / email   (weight 2.5)
+  net24       IPv4 /24 network            (weight 2.0)
+  asn         autonomous system           (weight 1.5)
+  first_seen  first-seen day window       (weight 1.0)
+  port        C2 / service port           (weight 0.5)
+
+correlate(ioc) walks only the posting lists of that IOC's own attributes
+rarest first and scores every IOC it meets by weighted overlap. Each
+attribute's weight is damped by how common the value is, so port 443
+counts for little and a rare malware family for a lot. Very common values
+only add to candidates found through rarer ones. The top k come back from
+a heap. Cost depends on the IOC's neighbourhood, not the size of the graph.
+
+update()/remove() change single IOCs, and sync() applies a whole new
+feed snapshot by touching only IOCs whose attributes changed.
+
+The engine is thread-safe: a lock serializes changes against
+correlate(), so a query never sees a half-applied sync, and only one
+thread reloads the threat cache at a time. Async callers go through
+correlate_ioc() in an executor, which also keeps a re-sync off the loop.
+"""
+import heapq
+import math
+import os
+import threading
+from datetime import datetime
+
+from threat_cache import load_threat_cache
+
+WEIGHTS = {
+    'malware': 3.0,
+    'registrant': 2.5,
+    'net24': 2.0,
+    'asn': 1.5,
+    'first_seen': 1.0,
+    'port': 0.5,
+}
+FIRST_SEEN_WINDOW = 86400
+# Posting lists up to this size seed candidates; longer (common) values only
+# add to the scores of candidates found through rarer attributes
+SEED_LIMIT = 1000
+
+CACHE_FILES = (
+    "/opt/shadowcore/feeds/clean/threat_cache_clean.json",
+    "/opt/shadowcore/feeds/processed/threat_cache.json",
+)
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _ipv4_prefix(ioc):
+    parts = ioc.split('.')
+    if len(parts) == 4 and all(p.isdigit() and int(p) <= 255 for p in parts):
+        return '.'.join(parts[:3])
+    return None
+
+
+class CorrelationEngine:
+    """Attribute inverted indexes with weighted top-k scoring"""
+
+    def __init__(self, weights=WEIGHTS, window=FIRST_SEEN_WINDOW, geo=None, seed_limit=SEED_LIMIT):
+        self.weights = dict(weights)
+        self.window = window
+        self.geo = geo
+        self.seed_limit = seed_limit
+        self.index = {}
+        self.keys = {}
+        self.records = {}
+        self._synced_mtime = None
+        # Index changes vs. queries, and one threat-cache reload at a time
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+
+    def attributes(self, ioc, record):
+        """Index keys (attr, value) for an IOC and its feed record"""
+        record = record or {}
+        keys = set()
+        malware = record.get('malware')
+        if malware:
+            keys.add(('malware', str(malware).lower()))
+        registrant = record.get('registrant') or record.get('registrant_email')
+        if registrant:
+            keys.add(('registrant', str(registrant).lower()))
+        port = record.get('port')
+        if port not in (None, ''):
+            keys.add(('port', str(port)))
+
+        prefix = _ipv4_prefix(ioc)
+        if prefix:
+            keys.add(('net24', prefix))
+        asn = record.get('asn')
+        if asn is None and prefix and self.geo is not None:
+            asn = self.geo.lookup(ioc).get('asn')
+        if asn:
+            keys.add(('asn', str(asn)))
+
+        # Only a real first-seen date: 'timestamp' is the shared feed
+        # generation and would put every IOC in one window
+        seen = _epoch(record.get('first_seen'))
+        if seen is not None:
+            keys.add(('first_seen', int(seen // self.window)))
+        return frozenset(keys)
+
+    # ----- incremental maintenance --------------------------------------
+
+    def update(self, ioc, record):
+        """Add or re-index one IOC"""
+        keys = self.attributes(ioc, record)
+        with self._lock:
+            self._update(ioc, keys, record)
+
+    def _update(self, ioc, keys, record):
+        old = self.keys.get(ioc)
+        if old == keys:
+            self.records[ioc] = self._summary(record)
+            return
+        if old:
+            for key in old - keys:
+                self._unlink(key, ioc)
+        for key in keys - (old or frozenset()):
+            self.index.setdefault(key, set()).add(ioc)
+        self.keys[ioc] = keys
+        self.records[ioc] = self._summary(record)
+
+    def remove(self, ioc):
+        with self._lock:
+            for key in self.keys.pop(ioc, ()):
+                self._unlink(key, ioc)
+            self.records.pop(ioc, None)
+
+    def _unlink(self, key, ioc):
+        members = self.index.get(key)
+        if members is not None:
+            members.discard(ioc)
+            if not members:
+                del self.index[key]
+
+    @staticmethod
+    def _summary(record):
+        record = record or {}
+        return {'type': record.get('type', 'unknown'), 'malware': record.get('malware')}
+
+    def sync(self, feed):
+        """Bring the indexes in line with a full feed mapping {ioc: record}
+
+        Unchanged IOCs cost one key comparison; only added, changed and
+        removed IOCs touch the posting lists. Returns (added/changed, removed).
+        """
+        # Attribute extraction (geo lookups) happens before taking the lock
+        updates = [(ioc, self.attributes(ioc, record), record) for ioc, record in feed.items()]
+        changed = 0
+        with self._lock:
+            for ioc, keys, record in updates:
+                changed += self.keys.get(ioc) != keys
+                self._update(ioc, keys, record)
+            gone = [ioc for ioc in self.keys if ioc not in feed]
+            for ioc in gone:
+                self.remove(ioc)
+        return changed, len(gone)
+
+    def sync_threat_cache(self, cache_files=CACHE_FILES):
+        """Re-sync from the threat cache file if it changed since last time"""
+        with self._reload_lock:
+            for path in cache_files:
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if mtime != self._synced_mtime:
+                    _, cache = load_threat_cache(path)
+                    self.sync(cache)
+                    self._synced_mtime = mtime
+                return
+
+    # ----- queries -------------------------------------------------------
+
+    def correlate(self, ioc, record=None, k=5):
+        """Top-k related IOCs: [{'id', 'type', 'malware', 'score', 'shared'}], best first
+
+        Known IOCs use their indexed attributes; unknown ones are scored from
+        record (and the IOC itself, e.g. its /24) without being indexed.
+        """
+        keys = self.keys.get(ioc)
+        if keys is None:
+            keys = self.attributes(ioc, record)
+        with self._lock:
+            return self._correlate(ioc, keys, k)
+
+    def _correlate(self, ioc, keys, k):
+        scores = {}
+        shared = {}
+        possible = sum(self.weights.get(key[0], 0.0) for key in keys)
+        postings = [(self.index.get(key, ()), key) for key in keys]
+        for members, key in sorted(postings, key=lambda p: len(p[0])):
+            if not members:
+                continue
+            # Rarer values are stronger evidence
+            weight = self.weights.get(key[0], 0.0) / (1.0 + math.log(len(members)))
+            if len(members) <= self.seed_limit:
+                candidates = members
+            else:
+                candidates = [other for other in scores if other in members]
+            for other in candidates:
+                if other == ioc:
+                    continue
+                scores[other] = scores.get(other, 0.0) + weight
+                shared.setdefault(other, []).append(key[0])
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [{
+            'id': other,
+            'type': self.records.get(other, {}).get('type', 'unknown'),
+            'malware': self.records.get(other, {}).get('malware'),
+            'score': round(score / possible, 3) if possible else 0.0,
+            'shared': sorted(shared[other]),
+        } for other, score in top]
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+    def _stats(self):
+        return {
+            'iocs': len(self.keys),
+            'keys': len(self.index),
+            'by_attribute': {
+                attr: sum(1 for key in self.index if key[0] == attr) for attr in self.weights
+            },
+        }
+
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def get_correlation_engine():
+    """Shared per-process engine over the clean threat cache (kept in sync)"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            try:
+                from geo_index import get_geo_index
+                geo = get_geo_index()
+            except Exception:
+                geo = None
+            _shared_engine = CorrelationEngine(geo=geo)
+    _shared_engine.sync_threat_cache()
+    return _shared_engine
+
+
+def correlate_ioc(ioc, record=None, k=5):
+    """correlate() on the shared engine - blocking, run it in an executor"""
+    return get_correlation_engine().correlate(ioc, record, k=k)
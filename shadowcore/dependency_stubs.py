@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for every ShadowCore dependency, for benchmarks and tests
+
+    stubs = DependencyStubs({'redis': Fault(0.3), 'graph': Fault(2, 0.01)})
+    await stubs.start()
+    orchestrator = CleanShadowCoreOrchestrator(redis=stubs.redis, neo4j_driver=stubs.graph)
+    ...
+    await stubs.stop()
+
+  MemoryRedis   the redis.asyncio calls ShadowCore makes (get, set, setex,
+                non-transactional pipelines, execute_command, aclose); one
+                simulated round trip per call or pipeline
+  MemoryGraph   neo4j async driver / session / result for the graph_store
+                lookup and upsert queries, over a dict of IOC nodes
+  ServiceStub   aiohttp JSON service answering every path - REST API
+                (:8000), ShadowBrain (:8001), proxy (:8080) and
+                ThreatInsight (:9090, /api/enrich)
+  Ollama        ollama_stub.py on :11434
+
+Each dependency has a Fault(latency_ms, fail_rate, jitter_ms): calls wait
+latency_ms (+ up to jitter_ms) and fail with that probability - a
+ConnectionError for Redis/graph, HTTP 500 for the services. Parse one from
+"12.5" or "12.5:0.02" with Fault.parse.
+
+Usage:
+    python3 dependency_stubs.py --dep http=20:0.01 --dep ollama=5
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+
+from aiohttp import web
+
+from ollama_stub import start_stub
+
+HTTP_SERVICES = {
+    'rest_api': 8000,
+    'shadowbrain': 8001,
+    'proxy': 8080,
+    'threat_insight': 9090,
+}
+OLLAMA_PORT = 11434
+DEPENDENCIES = ('redis', 'graph', 'http', 'ollama')
+
+
+class Fault:
+    """Latency and failure profile of one dependency"""
+
+    __slots__ = ('latency_ms', 'fail_rate', 'jitter_ms')
+
+    def __init__(self, latency_ms=0.0, fail_rate=0.0, jitter_ms=0.0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.jitter_ms = jitter_ms
+
+    @classmethod
+    def parse(cls, spec):
+        """Fault from "latency_ms[:fail_rate[:jitter_ms]]" """
+        parts = [float(p) for p in spec.split(':')]
+        return cls(*parts)
+
+    async def apply(self, error=ConnectionError):
+        """Wait one simulated round trip, then maybe raise error"""
+        delay = self.latency_ms + (random.random() * self.jitter_ms if self.jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise error("injected failure")
+
+    def to_dict(self):
+        return {'latency_ms': self.latency_ms, 'fail_rate': self.fail_rate, 'jitter_ms': self.jitter_ms}
+
+
+# ----- Redis ---------------------------------------------------------------
+
+class MemoryRedis:
+    """In-memory stand-in for a redis.asyncio client (decode_responses=True)"""
+
+    def __init__(self, fault=None):
+        self.fault = fault or Fault()
+        self.data = {}
+        self.stats = {'round_trips': 0, 'commands': 0, 'failures': 0}
+
+    def _expired(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return True
+        return entry is None
+
+    def _apply(self, command, *args):
+        self.stats['commands'] += 1
+        name = command.lower()
+        if name == 'get':
+            return None if self._expired(args[0]) else self.data[args[0]][0]
+        if name == 'set':
+            self.data[args[0]] = (str(args[1]), None)
+            return True
+        if name == 'setex':
+            self.data[args[0]] = (str(args[2]), time.monotonic() + float(args[1]))
+            return True
+        if name == 'delete':
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if name == 'ping':
+            return True
+        raise ValueError(f"unsupported command {command}")
+
+    async def _round_trip(self, commands):
+        self.stats['round_trips'] += 1
+        try:
+            await self.fault.apply()
+        except ConnectionError:
+            self.stats['failures'] += 1
+            raise
+        return [self._apply(*command) for command in commands]
+
+    async def execute_command(self, *args):
+        return (await self._round_trip([args]))[0]
+
+    async def get(self, key):
+        return await self.execute_command('GET', key)
+
+    async def set(self, key, value):
+        return await self.execute_command('SET', key, value)
+
+    async def setex(self, key, seconds, value):
+        return await self.execute_command('SETEX', key, seconds, value)
+
+    async def delete(self, *keys):
+        return await self.execute_command('DELETE', *keys)
+
+    async def ping(self):
+        return await self.execute_command('PING')
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class MemoryPipeline:
+    """Buffers commands and sends them as one round trip on execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.commands = []
+
+    def _queue(self, *command):
+        self.commands.append(command)
+        return self
+
+    def get(self, key):
+        return self._queue('GET', key)
+
+    def set(self, key, value):
+        return self._queue('SET', key, value)
+
+    def setex(self, key, seconds, value):
+        return self._queue('SETEX', key, seconds, value)
+
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        return await self.redis._round_trip(commands)
+
+
+# ----- knowledge graph -----------------------------------------------------
+
+class MemoryGraph:
+    """In-memory stand-in for a neo4j AsyncDriver serving graph_store queries
+
+    Nodes are {ioc: [related labels]}; lookups (iocs=...) return the known
+    ones, upserts (rows=...) create missing nodes and report created.
+    """
+
+    def __init__(self, fault=None, nodes=None):
+        self.fault = fault or Fault()
+        self.nodes = dict(nodes or {})
+        self.stats = {'queries': 0, 'lookups': 0, 'upserts': 0, 'failures': 0}
+
+    @classmethod
+    def seeded(cls, iocs, fault=None, labels=(('Malware',), ('ThreatActor',), ('Campaign',))):
+        """Graph where every IOC has 1-3 deterministic relations"""
+        nodes = {}
+        for ioc in iocs:
+            h = zlib.crc32(ioc.encode())
+            nodes[ioc] = [list(labels[(h + i) % len(labels)]) for i in range(1 + h % 3)]
+        return cls(fault, nodes)
+
+    def session(self, **kwargs):
+        return MemorySession(self)
+
+    async def run(self, query, iocs=None, rows=None, **params):
+        self.stats['queries'] += 1
+        try:
+            await self.fault.apply()
+        except ConnectionError:
+            self.stats['failures'] += 1
+            raise
+        records = []
+        if iocs is not None:
+            self.stats['lookups'] += len(iocs)
+            for ioc in iocs:
+                related = self.nodes.get(ioc)
+                if related is not None:
+                    records.append({'ioc': ioc, 'relations': len(related), 'related_labels': related})
+        elif rows is not None:
+            self.stats['upserts'] += len(rows)
+            for row in rows:
+                created = row['ioc'] not in self.nodes
+                related = self.nodes.setdefault(row['ioc'], [])
+                records.append({'ioc': row['ioc'], 'created': created,
+                                'relations': len(related), 'related_labels': related})
+        return MemoryResult(records)
+
+    async def close(self):
+        pass
+
+
+class MemorySession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def run(self, query, **params):
+        return await self.graph.run(query, **params)
+
+
+class MemoryResult:
+    def __init__(self, records):
+        self._records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._records)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+# ----- HTTP services -------------------------------------------------------
+
+class ServiceStub:
+    """aiohttp JSON service that answers every GET/POST path"""
+
+    def __init__(self, name, fault=None):
+        self.name = name
+        self.fault = fault or Fault()
+        self.stats = {'requests': 0, 'failed': 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        return app
+
+    async def handle(self, request):
+        self.stats['requests'] += 1
+        try:
+            await self.fault.apply()
+        except ConnectionError:
+            self.stats['failed'] += 1
+            return web.json_response({'error': 'stub failure', 'service': self.name}, status=500)
+        ioc = request.query.get('ioc', '')
+        body = {'status': 'ok', 'service': self.name, 'path': request.path}
+        if ioc:
+            h = zlib.crc32(ioc.encode())
+            body.update({'ioc': ioc, 'reputation': h % 100, 'first_seen': 1700000000 + h % 10000000,
+                         'sources': ['stub-osint'] if h % 2 else []})
+        return web.json_response(body)
+
+
+# ----- all together --------------------------------------------------------
+
+class DependencyStubs:
+    """Starts and stops the HTTP stubs and holds the in-memory clients"""
+
+    def __init__(self, faults=None, host='127.0.0.1', port_offset=0, graph_iocs=()):
+        faults = dict(faults or {})
+        self.faults = {name: faults.get(name) or Fault() for name in DEPENDENCIES}
+        self.host = host
+        self.port_offset = port_offset
+        self.redis = MemoryRedis(self.faults['redis'])
+        self.graph = MemoryGraph.seeded(graph_iocs, self.faults['graph'])
+        self.services = {name: ServiceStub(name, self.faults['http']) for name in HTTP_SERVICES}
+        self.ollama = None
+        self._runners = []
+
+    def url(self, service):
+        if service == 'ollama':
+            return f"http://{self.host}:{OLLAMA_PORT + self.port_offset}"
+        return f"http://{self.host}:{HTTP_SERVICES[service] + self.port_offset}"
+
+    async def start(self):
+        for name, stub in self.services.items():
+            runner = web.AppRunner(stub.app(), access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, HTTP_SERVICES[name] + self.port_offset).start()
+            self._runners.append(runner)
+        # The Ollama fault is per token; failures are whole requests
+        fault = self.faults['ollama']
+        runner, self.ollama = await start_stub(
+            OLLAMA_PORT + self.port_offset, self.host,
+            token_delay=fault.latency_ms / 1000, fail_rate=fault.fail_rate
+        )
+        self._runners.append(runner)
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+
+    def snapshot(self):
+        return {
+            'faults': {name: fault.to_dict() for name, fault in self.faults.items()},
+            'redis': dict(self.redis.stats, keys=len(self.redis.data)),
+            'graph': dict(self.graph.stats, nodes=len(self.graph.nodes)),
+            'http': {name: dict(stub.stats) for name, stub in self.services.items()},
+            'ollama': dict(self.ollama.stats) if self.ollama else None,
+        }
+
+
+def parse_faults(specs):
+    """{'http': Fault(...)} from ["http=20:0.01", ...]"""
+    faults = {}
+    for spec in specs or ():
+        name, _, value = spec.partition('=')
+        if name not in DEPENDENCIES or not value:
+            raise ValueError(f"expected NAME=LATENCY_MS[:FAIL_RATE[:JITTER_MS]] with NAME in {DEPENDENCIES}")
+        faults[name] = Fault.parse(value)
+    return faults
+
+
+async def serve(args):
+    stubs = DependencyStubs(parse_faults(args.dep), args.host, args.port_offset)
+    await stubs.start()
+    for name in list(HTTP_SERVICES) + ['ollama']:
+        print(f"  {name:15} {stubs.url(name)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stubs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-ins for ShadowCore HTTP dependencies')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port-offset', type=int, default=0, help='added to every default port')
+    parser.add_argument('--dep', action='append', metavar='NAME=MS[:FAIL[:JITTER]]',
+                        help=f"fault profile for one of {', '.join(DEPENDENCIES)} (repeatable)")
+    args = parser.parse_args()
+    print("🧪 Dependency stubs:")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
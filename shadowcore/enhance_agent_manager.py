@@ -7,6 +7,8 @@ import json
 import time
 from datetime import datetime
 
+from ioc_classifier import ioc_type, normalize_ioc
+
 # Enhanced task scheduler
 class EnhancedAgentManager:
     def __init__(self):
@@ -19,12 +21,13 @@ class EnhancedAgentManager:
     
     def schedule_analysis(self, ioc, priority="medium", requester="automation"):
         """Enhanced scheduling with ACL"""
+        ioc = normalize_ioc(ioc)
         task_id = f"task_{int(time.time())}_{hash(ioc) % 1000:04d}"
         
         task = {
             "id": task_id,
             "ioc": ioc,
-            "type": self._detect_ioc_type(ioc),
+            "type": ioc_type(ioc),
             "priority": priority,
             "requester": requester,
             "scheduled_at": datetime.now().isoformat(),
@@ -38,27 +41,20 @@ class EnhancedAgentManager:
     
     def _assign_workers(self, ioc):
         """Intelligently assign workers based on IOC type"""
-        ioc_type = self._detect_ioc_type(ioc)
+        kind = ioc_type(ioc)
         
         workers = {
             "ip": ["geo_lookup", "reputation_check", "port_scan"],
+            "ipv6": ["geo_lookup", "reputation_check", "port_scan"],
+            "ip_port": ["reputation_check", "service_probe"],
+            "cidr": ["netblock_whois", "reputation_check"],
+            "email": ["mx_lookup", "breach_check", "phishing_check"],
             "domain": ["dns_resolution", "whois_lookup", "certificate_check"],
             "hash": ["virustotal_check", "malware_analysis", "sandbox_submit"],
             "url": ["content_fetch", "phishing_check", "screenshot"]
         }
         
-        return workers.get(ioc_type, ["general_analysis"])
-    
-    def _detect_ioc_type(self, ioc):
-        if ioc.count('.') == 3 and all(p.isdigit() for p in ioc.split('.')):
-            return "ip"
-        elif '.' in ioc and not ioc.startswith('http'):
-            return "domain"
-        elif ioc.startswith('http'):
-            return "url"
-        elif len(ioc) in [32, 40, 64]:
-            return "hash"
-        return "unknown"
+        return workers.get(kind, ["general_analysis"])
     
     def _get_acl_for_requester(self, requester):
         return self.acl_rules.get(requester, ["read"])
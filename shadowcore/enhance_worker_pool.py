@@ -6,6 +6,8 @@ Enhance your Worker Pool with specialized workers
 import asyncio
 import aiohttp
 
+from geo_index import get_geo_index
+
 class EnhancedWorkerPool:
     def __init__(self):
         self.workers = {
@@ -16,13 +18,14 @@ class EnhancedWorkerPool:
         }
     
     async def geo_lookup_worker(self, ioc):
-        """Geolocation lookup worker"""
-        # Simulated geolocation
+        """Geolocation lookup worker (offline ASN/country range index)"""
+        geo_index = get_geo_index()
+        record = geo_index.lookup(ioc) if geo_index else {"asn": None, "country": "Unknown", "org": "Unknown ISP"}
         return {
             "worker": "geo_lookup",
-            "country": "Unknown",
-            "asn": "ASN Unknown",
-            "provider": "Unknown ISP"
+            "country": record["country"],
+            "asn": f"AS{record['asn']}" if record["asn"] else "ASN Unknown",
+            "provider": record["org"]
         }
     
     async def reputation_worker(self, ioc):
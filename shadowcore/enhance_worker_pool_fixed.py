@@ -6,6 +6,8 @@ Enhanced Worker Pool - Fixed Version
 import asyncio
 import aiohttp
 
+from geo_index import get_geo_index
+
 class EnhancedWorkerPool:
     def __init__(self):
         self.workers = {
@@ -16,13 +18,24 @@ class EnhancedWorkerPool:
         }
     
     async def geo_lookup_worker(self, ioc):
-        """Geolocation lookup worker"""
+        """Geolocation lookup worker (offline ASN/country range index)"""
+        geo_index = get_geo_index()
+        if geo_index is None:
+            return {
+                "worker": "geo_lookup",
+                "country": "Unknown",
+                "asn": "ASN Unknown",
+                "provider": "Unknown ISP",
+                "confidence": 0.5
+            }
+        
+        record = geo_index.lookup(ioc)
         return {
             "worker": "geo_lookup",
-            "country": "Unknown",
-            "asn": "ASN Unknown",
-            "provider": "Unknown ISP",
-            "confidence": 0.5
+            "country": record["country"],
+            "asn": f"AS{record['asn']}" if record["asn"] else "ASN Unknown",
+            "provider": record["org"],
+            "confidence": 0.9 if record["asn"] else 0.5
         }
     
     async def reputation_worker(self, ioc):
@@ -10,6 +10,8 @@ import redis
 from neo4j import GraphDatabase
 import os
 
+from threat_cache import load_threat_cache
+
 print("🤖 SHADOWCORE ENHANCED ORCHESTRATOR")
 print("=" * 60)
 print("Now with REAL threat feed integration")
@@ -36,14 +38,8 @@ class EnhancedShadowCoreOrchestrator:
     
     def load_threat_cache(self):
         """Load threat cache from feed processor"""
-        cache_file = "/opt/shadowcore/feeds/processed/threat_cache.json"
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file) as f:
-                    return json.load(f)
-            except:
-                pass
-        return {}
+        cache_file, cache = load_threat_cache("/opt/shadowcore/feeds/processed/threat_cache.json")
+        return cache
     
     async def process_ioc(self, ioc):
         """Process IOC with REAL feed intelligence"""
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Two-tier TTL cache for enrichment calls (OSINT, shadowbrain, Ollama)
+
+    cache = EnrichmentCache(redis_client)
+    data = await cache.get("threat_insight", ioc, lambda: fetch_enrichment(ioc))
+
+Entries are keyed by (source, normalized IOC, options) and live in a
+per-process LRU in front of a shared Redis tier, so every orchestrator
+process benefits from an enrichment any of them fetched. Each source has
+its own TTL. Past the TTL an entry is still served for a further
+stale_factor x TTL while one background call refreshes it, so a repeated
+IOC never waits on a slow backend; only a cold miss does, and concurrent
+misses for one key share a single call.
+
+fetch results of None are not cached (the caller's fallback applies), and
+exceptions propagate to the caller on a miss and are counted on a
+background refresh. The Redis client may be sync or redis.asyncio; sync
+calls run in the default executor. Redis errors only disable the tier
+for that call.
+"""
+import asyncio
+import hashlib
+import inspect
+import json
+import math
+import time
+from collections import OrderedDict
+
+from ioc_classifier import normalize_ioc
+from single_flight import SingleFlight
+
+# Seconds an enrichment stays fresh, per source
+SOURCE_TTLS = {
+    'threat_insight': 6 * 3600,
+    'shadowbrain': 3600,
+    'ollama': 24 * 3600,
+}
+DEFAULT_TTL = 3600
+STALE_FACTOR = 0.5
+MAX_ENTRIES = 10000
+KEY_PREFIX = "enrich:"
+
+COUNTERS = ('lookups', 'memory_hits', 'redis_hits', 'stale_hits', 'misses',
+            'refreshes', 'refresh_errors')
+
+
+class EnrichmentCache:
+    """Memory + Redis cache with per-source TTLs and stale-while-revalidate"""
+
+    def __init__(self, redis=None, ttls=SOURCE_TTLS, stale_factor=STALE_FACTOR, max_entries=MAX_ENTRIES):
+        self.redis = redis
+        self.ttls = dict(ttls)
+        self.stale_factor = stale_factor
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.flights = SingleFlight()
+        self.counters = {}
+        self.redis_errors = 0
+        self._refreshing = set()
+        self._tasks = set()
+        self._redis_async = redis is not None and inspect.iscoroutinefunction(
+            getattr(type(redis), 'execute_command', None))
+
+    def ttl(self, source):
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def key(self, source, ioc, options=None):
+        """Cache key for (source, normalized IOC, options)"""
+        digest = '-'
+        if options:
+            encoded = json.dumps(options, sort_keys=True, default=str).encode()
+            digest = hashlib.sha1(encoded).hexdigest()[:12]
+        return f"{KEY_PREFIX}{source}:{normalize_ioc(ioc)}:{digest}"
+
+    def _count(self, source, name):
+        counters = self.counters.get(source)
+        if counters is None:
+            counters = self.counters[source] = dict.fromkeys(COUNTERS, 0)
+        counters[name] += 1
+
+    # ----- lookups -------------------------------------------------------
+
+    async def get(self, source, ioc, fetch, options=None):
+        """Cached result of fetch() (a zero-argument coroutine function)"""
+        key = self.key(source, ioc, options)
+        self._count(source, 'lookups')
+
+        tier = 'memory_hits'
+        entry = self.entries.get(key)
+        if entry is None:
+            tier = 'redis_hits'
+            entry = await self._redis_get(key)
+            if entry is not None:
+                self._remember(key, entry)
+        else:
+            self.entries.move_to_end(key)
+
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            ttl = self.ttl(source)
+            if age < ttl:
+                self._count(source, tier)
+                return value
+            if age < ttl * (1 + self.stale_factor):
+                self._count(source, 'stale_hits')
+                self._revalidate(source, key, fetch)
+                return value
+
+        self._count(source, 'misses')
+        return await self.flights.do(key, lambda: self._fetch(source, key, fetch))
+
+    async def _fetch(self, source, key, fetch):
+        value = await fetch()
+        if value is not None:
+            entry = (time.time(), value)
+            self._remember(key, entry)
+            await self._redis_set(key, entry, self.ttl(source))
+        return value
+
+    def _revalidate(self, source, key, fetch):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.ensure_future(self._refresh(source, key, fetch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, source, key, fetch):
+        self._count(source, 'refreshes')
+        try:
+            await self.flights.do(key, lambda: self._fetch(source, key, fetch))
+        except Exception:
+            self._count(source, 'refresh_errors')
+        finally:
+            self._refreshing.discard(key)
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # ----- Redis tier ----------------------------------------------------
+
+    async def _redis_call(self, method, *args):
+        if self.redis is None:
+            return None
+        try:
+            if self._redis_async:
+                return await getattr(self.redis, method)(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, getattr(self.redis, method), *args)
+        except Exception:
+            self.redis_errors += 1
+            return None
+
+    async def _redis_get(self, key):
+        raw = await self._redis_call('get', key)
+        if raw is None:
+            return None
+        try:
+            data = json.loads(raw)
+            return data['t'], data['v']
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    async def _redis_set(self, key, entry, ttl):
+        # Redis keeps the entry through its stale window too
+        expire = math.ceil(ttl * (1 + self.stale_factor))
+        payload = json.dumps({'t': entry[0], 'v': entry[1]}, default=str)
+        await self._redis_call('setex', key, expire, payload)
+
+    # ----- metrics -------------------------------------------------------
+
+    def snapshot(self):
+        """Counters and hit rates per source and overall"""
+        def with_rate(counters):
+            hits = counters['memory_hits'] + counters['redis_hits'] + counters['stale_hits']
+            rate = round(hits / counters['lookups'], 3) if counters['lookups'] else 0.0
+            return dict(counters, hit_rate=rate)
+
+        total = dict.fromkeys(COUNTERS, 0)
+        for counters in self.counters.values():
+            for name, n in counters.items():
+                total[name] += n
+        return {
+            'entries': len(self.entries),
+            'redis': self.redis is not None,
+            'redis_errors': self.redis_errors,
+            'refreshing': len(self._refreshing),
+            'total': with_rate(total),
+            'sources': {source: with_rate(c) for source, c in sorted(self.counters.items())},
+        }
@@ -10,6 +10,8 @@ from datetime import datetime
 from neo4j import GraphDatabase
 import redis
 
+from report_store import ReportStore
+
 print("🎬 SHADOWCORE FINAL DEMONSTRATION")
 print("="*60)
 print("Showing your complete 'Better Palantir' in action")
@@ -218,8 +220,7 @@ def create_final_report():
     print("-"*50)
     
     # Gather statistics
-    reports_dir = "/opt/shadowcore/intelligence_reports"
-    report_count = len([f for f in os.listdir(reports_dir) if f.endswith('.json')]) if os.path.exists(reports_dir) else 0
+    report_count = ReportStore().stats()['reports']
     
     # Neo4j stats
     driver = GraphDatabase.driver(
@@ -11,6 +11,8 @@ from neo4j import GraphDatabase
 import redis
 import requests
 
+from report_store import ReportStore
+
 print("🔗 SHADOWCORE FINAL INTEGRATION")
 print("="*60)
 print("Connecting real threat intelligence to your operational system")
@@ -163,26 +165,17 @@ class ShadowCoreIntegrator:
             "threat_alerts": []
         }
         
-        # Get recent reports
-        reports_dir = "/opt/shadowcore/intelligence_reports"
-        if os.path.exists(reports_dir):
-            reports = [f for f in os.listdir(reports_dir) if f.endswith('.json')]
-            
-            for report_file in sorted(reports)[-3:]:  # Last 3 reports
-                try:
-                    with open(os.path.join(reports_dir, report_file), 'r') as f:
-                        report_data = json.load(f)
-                    
-                    if "reports" in report_data:
-                        for report in report_data["reports"]:
-                            dashboard_data["recent_activity"].append({
-                                "ioc": report.get("ioc", ""),
-                                "threat_level": report.get("threat_assessment", {}).get("level", "unknown"),
-                                "timestamp": report.get("timestamp", ""),
-                                "report_id": report.get("report_id", "")
-                            })
-                except:
-                    pass
+        # Get recent reports - newest first straight from the store index
+        try:
+            for report in ReportStore().latest(10):
+                dashboard_data["recent_activity"].append({
+                    "ioc": report.get("ioc", ""),
+                    "threat_level": report.get("threat_assessment", {}).get("level", "unknown"),
+                    "timestamp": report.get("timestamp", ""),
+                    "report_id": report.get("report_id", "")
+                })
+        except OSError:
+            pass
         
         # Get Neo4j stats
         try:
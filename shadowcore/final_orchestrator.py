@@ -13,6 +13,20 @@ import aiohttp
 import redis
 from neo4j import GraphDatabase
 
+from circuit_breaker import CircuitOpenError, breakers
+from correlation_engine import correlate_ioc
+from enrichment_cache import EnrichmentCache
+from ioc_classifier import ioc_type, normalize_ioc
+from llm_stage import OllamaStage, WebSocketTokenFeed
+from report_store import ReportStore
+from stage_graph import StageGraph
+from tracing import tracer
+from vector_index import get_vector_index, threat_text
+
+# Report order of the pipeline steps (the last one is correlation)
+PIPELINE_STEPS = ["agent_manager", "worker_pool", "ai_engines", "osint_engine",
+                  "memory_store", "memory_correlate"]
+
 print("🧠 SHADOWCORE FINAL ORCHESTRATOR")
 print("=" * 60)
 print("Your Vision: Agent Manager + Worker Pool + AI Engines + OSINT + Memory")
@@ -80,10 +94,28 @@ class ShadowCoreOrchestrator:
         except Exception as e:
             print(f"  ⚠️  Neo4j: Connection failed: {e}")
         
+        # Pipeline stages and their data dependencies
+        self.pipeline = self._build_pipeline()
+        
+        # Enrichment results cached per source (memory, then shared Redis)
+        self.enrichment = EnrichmentCache(self.redis_client)
+        
+        # LLM stage: batched, cached, streams tokens to the WebSocket feed
+        self.llm = OllamaStage(
+            self.ai_engines["ollama"],
+            on_token=WebSocketTokenFeed(self.worker_pool["websocket"])
+        )
+        
         print("✅ Orchestrator ready")
     
-    async def process_ioc(self, ioc):
-        """Process an IOC through your complete pipeline"""
+    @tracer.traced("process_ioc")
+    async def process_ioc(self, ioc, budget_ms=None):
+        """Process an IOC through your complete pipeline
+        
+        With budget_ms, stages still running when the budget runs out are
+        dropped and the report lists which steps completed.
+        """
+        ioc = normalize_ioc(ioc)
         print(f"\n🔍 Processing: {ioc}")
         print("-" * 40)
         
@@ -93,37 +125,23 @@ class ShadowCoreOrchestrator:
             "pipeline": []
         }
         
-        # 1. AGENT MANAGER - Schedule
-        print("1. 👔 Agent Manager: Scheduling...")
-        scheduled = await self._schedule_task(ioc)
-        results["pipeline"].append({"step": "agent_manager", "result": scheduled})
-        
-        # 2. WORKER POOL - Process
-        print("2. 👷 Worker Pool: Processing...")
-        processed = await self._worker_process(ioc)
-        results["pipeline"].append({"step": "worker_pool", "result": processed})
-        
-        # 3. AI ENGINES - Analyze
-        print("3. 🤖 AI Engines: Analyzing...")
-        ai_analysis = await self._ai_analyze(processed)
-        results["pipeline"].append({"step": "ai_engines", "result": ai_analysis})
-        
-        # 4. OSINT ENGINE - Enrich
-        print("4. 📡 OSINT Engine: Enriching...")
-        osint_data = await self._osint_enrich(ioc, ai_analysis)
-        results["pipeline"].append({"step": "osint_engine", "result": osint_data})
-        
-        # 5. MEMORY - Store & Correlate
-        print("5. 🗄️ Memory: Storing & Correlating...")
-        stored = await self._store_intelligence(ioc, {
-            "processed": processed,
-            "ai_analysis": ai_analysis,
-            "osint_data": osint_data
-        })
-        results["pipeline"].append({"step": "memory_store", "result": stored})
-        
-        correlated = await self._correlate_intelligence(ioc)
-        results["pipeline"].append({"step": "memory_correlate", "result": correlated})
+        # 1-5. Agent Manager, Worker Pool, AI, OSINT and Memory run as a stage
+        # graph - OSINT and correlation don't wait for the AI engines
+        print("⚡ Running pipeline stages (concurrent where independent)...")
+        timings = {}
+        deadline = time.monotonic() + budget_ms / 1000 if budget_ms is not None else None
+        stage_results = await self.pipeline.run(ioc, timings=timings, deadline=deadline)
+        for step in PIPELINE_STEPS:
+            if step in stage_results:
+                results["pipeline"].append({"step": step, "result": stage_results[step]})
+                print(f"   {step:17} {timings[step] * 1000:7.1f} ms")
+            else:
+                print(f"   {step:17} skipped (budget {budget_ms} ms)")
+        results["stages"] = {
+            "completed": [s for s in PIPELINE_STEPS if s in stage_results],
+            "skipped": [s for s in PIPELINE_STEPS if s not in stage_results],
+            "budget_ms": budget_ms
+        }
         
         # 6. Generate final report
         print("6. 📊 Generating report...")
@@ -131,17 +149,75 @@ class ShadowCoreOrchestrator:
         
         return results
     
+    def _build_pipeline(self):
+        """Stage graph: each stage declares the results it needs"""
+        graph = StageGraph()
+        graph.add("agent_manager", self._schedule_task)
+        graph.add("worker_pool", self._worker_process)
+        graph.add("ai_engines", lambda ioc, worker_pool: self._ai_analyze(ioc, worker_pool),
+                  needs=["worker_pool"])
+        graph.add("osint_engine", lambda ioc: self._osint_enrich(ioc, None))
+        graph.add("memory_store", lambda ioc, worker_pool, ai_engines, osint_engine: self._store_intelligence(ioc, {
+            "processed": worker_pool,
+            "ai_analysis": ai_engines,
+            "osint_data": osint_engine
+        }), needs=["worker_pool", "ai_engines", "osint_engine"])
+        graph.add("memory_correlate", self._correlate_intelligence)
+        return graph
+    
+    async def _request(self, dependency, method, url, timeout, parse_json=True, **kwargs):
+        """One outbound HTTP call, traced as a dependency span
+        
+        Returns the JSON body ({} if parse_json is False) for non-5xx
+        responses and None for 5xx. Connection errors and timeouts propagate
+        so each caller can fall back to simulation. A dependency whose
+        circuit breaker is open raises CircuitOpenError without a request.
+        """
+        breaker = breakers.get(dependency)
+        permit = breaker.allow()
+        if not permit:
+            raise CircuitOpenError(dependency)
+        try:
+            with tracer.span(dependency, kind="dependency", url=url) as span:
+                async with aiohttp.ClientSession() as session:
+                    async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+                        span.set(status=resp.status)
+                        if resp.status >= 500:
+                            breaker.record_failure(f"HTTP {resp.status}")
+                            return None
+                        data = await resp.json() if parse_json else {}
+            breaker.record_success()
+            return data
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        finally:
+            breaker.release(permit)
+    
+    def dependency_health(self):
+        """Circuit breaker state per dependency (shared across orchestrators)"""
+        return {
+            "open": breakers.open_names(),
+            "breakers": breakers.snapshot()
+        }
+    
+    def enrichment_stats(self):
+        """Enrichment cache hit rates per source"""
+        return self.enrichment.snapshot()
+    
+    async def close(self):
+        """Release the LLM stage's WebSocket feed connection"""
+        await self.llm.close()
+    
     async def _schedule_task(self, ioc):
         """Agent Manager schedules the task"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.agent_manager['rest_api']}/api/tasks",
-                    json={"ioc": ioc, "action": "analyze"},
-                    timeout=2
-                ) as resp:
-                    if resp.status < 500:
-                        return {"status": "scheduled", "via": "rest_api"}
+            scheduled = await self._request(
+                "rest_api", "POST", f"{self.agent_manager['rest_api']}/api/tasks",
+                timeout=2, parse_json=False, json={"ioc": ioc, "action": "analyze"}
+            )
+            if scheduled is not None:
+                return {"status": "scheduled", "via": "rest_api"}
         except:
             pass
         
@@ -155,24 +231,18 @@ class ShadowCoreOrchestrator:
         for worker in workers_to_try:
             try:
                 url = f"{self.worker_pool[worker]}/process"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        url,
-                        json={"ioc": ioc},
-                        timeout=2
-                    ) as resp:
-                        if resp.status < 500:
-                            data = await resp.json()
-                            return {"worker": worker, "data": data, "status": "processed"}
+                data = await self._request(worker, "POST", url, timeout=2, json={"ioc": ioc})
+                if data is not None:
+                    return {"worker": worker, "data": data, "status": "processed"}
             except:
                 continue
         
         # Simulation fallback
-        ioc_type = self._detect_ioc_type(ioc)
+        kind = ioc_type(ioc)
         return {
             "worker": "simulation",
             "data": {
-                "type": ioc_type,
+                "type": kind,
                 "value": ioc,
                 "analysis": "processed",
                 "indicators": ["needs_investigation"]
@@ -180,36 +250,32 @@ class ShadowCoreOrchestrator:
             "status": "processed"
         }
     
-    async def _ai_analyze(self, processed_data):
+    async def _ai_analyze(self, ioc, processed_data):
         """AI Engines analyze the data"""
         analysis = {}
         
         # Try shadowbrain
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ai_engines['shadowbrain']}/api/reason",
-                    json={"input": processed_data},
-                    timeout=3
-                ) as resp:
-                    if resp.status < 500:
-                        analysis["shadowbrain"] = await resp.json()
+            data = await self.enrichment.get("shadowbrain", ioc, lambda: self._request(
+                "shadowbrain", "POST", f"{self.ai_engines['shadowbrain']}/api/reason",
+                timeout=3, json={"input": processed_data}
+            ))
+            if data is not None:
+                analysis["shadowbrain"] = data
         except:
             analysis["shadowbrain"] = {"status": "unavailable", "reason": "connection_failed"}
         
-        # Try Ollama
+        # Ollama - concurrent IOCs share one prompt, repeats come from cache
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ai_engines['ollama']}/api/generate",
-                    json={"model": "llama2", "prompt": f"Analyze this threat IOC: {processed_data}"},
-                    timeout=5
-                ) as resp:
-                    if resp.status < 500:
-                        analysis["ollama"] = await resp.json()
+            analysis["ollama"] = await self.llm.analyze(ioc, context=processed_data.get("data"))
         except:
             analysis["ollama"] = {"status": "unavailable"}
         
+        # Nearest known threats from the local vector index
+        analysis["similar"] = get_vector_index().search_text(
+            threat_text(ioc, {"type": ioc_type(ioc)}), limit=3
+        )
+        
         # Add simulated AI analysis
         if "shadowbrain" not in analysis or analysis["shadowbrain"]["status"] == "unavailable":
             analysis["cognitive"] = {
@@ -224,14 +290,12 @@ class ShadowCoreOrchestrator:
     async def _osint_enrich(self, ioc, ai_analysis):
         """OSINT Engine enriches with external data"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.osint_engine['threat_insight']}/api/enrich",
-                    params={"ioc": ioc},
-                    timeout=3
-                ) as resp:
-                    if resp.status < 500:
-                        return await resp.json()
+            data = await self.enrichment.get("threat_insight", ioc, lambda: self._request(
+                "threat_insight", "GET", f"{self.osint_engine['threat_insight']}/api/enrich",
+                timeout=3, params={"ioc": ioc}
+            ))
+            if data is not None:
+                return data
         except:
             pass
         
@@ -244,14 +308,23 @@ class ShadowCoreOrchestrator:
         }
     
     async def _store_intelligence(self, ioc, data):
-        """Memory systems store the intelligence"""
+        """Memory systems store the intelligence
+        
+        The Redis and Neo4j clients are synchronous, so the writes run in
+        the default executor instead of blocking the other stages.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._store_intelligence_sync, ioc, data)
+    
+    def _store_intelligence_sync(self, ioc, data):
         stored = {}
         
         # Store in Redis
         if self.redis_client:
             try:
                 key = f"shadowcore:ioc:{ioc}:{int(time.time())}"
-                self.redis_client.setex(key, 86400, json.dumps(data))  # 24 hours
+                with tracer.span("redis_setex", kind="dependency"):
+                    self.redis_client.setex(key, 86400, json.dumps(data))  # 24 hours
                 stored["redis"] = {"key": key, "status": "stored"}
             except:
                 stored["redis"] = {"status": "failed"}
@@ -261,7 +334,7 @@ class ShadowCoreOrchestrator:
         # Store in Neo4j
         if self.neo4j_driver:
             try:
-                with self.neo4j_driver.session() as session:
+                with tracer.span("neo4j_store", kind="dependency"), self.neo4j_driver.session() as session:
                     # Create threat node
                     query = """
                     MERGE (t:Threat {id: $ioc})
@@ -274,7 +347,7 @@ class ShadowCoreOrchestrator:
                     
                     result = session.run(query, {
                         "ioc": ioc,
-                        "type": self._detect_ioc_type(ioc),
+                        "type": ioc_type(ioc),
                         "data": json.dumps(data)
                     })
                     
@@ -291,45 +364,20 @@ class ShadowCoreOrchestrator:
         return stored
     
     async def _correlate_intelligence(self, ioc):
-        """Memory correlates with existing intelligence"""
-        correlated = {
-            "related_threats": [],
-            "confidence": 0.0
-        }
+        """Memory correlates with existing intelligence
         
-        if self.neo4j_driver:
-            try:
-                with self.neo4j_driver.session() as session:
-                    # Find related threats (simplified)
-                    query = """
-                    MATCH (t:Threat)
-                    WHERE t.id <> $ioc
-                    RETURN t.id as related, t.type as type
-                    LIMIT 5
-                    """
-                    
-                    result = session.run(query, {"ioc": ioc})
-                    
-                    for record in result:
-                        correlated["related_threats"].append({
-                            "id": record["related"],
-                            "type": record["type"]
-                        })
-                    
-                    if correlated["related_threats"]:
-                        correlated["confidence"] = 0.7
-            except:
-                pass
-        
-        # Add simulated correlations if none found
-        if not correlated["related_threats"]:
-            correlated["related_threats"] = [
-                {"id": "related_001", "type": "ip", "confidence": 0.65},
-                {"id": "related_002", "type": "domain", "confidence": 0.55}
-            ]
-            correlated["confidence"] = 0.6
+        Related IOCs come from the correlation engine's attribute indexes
+        (malware, registrant, /24, ASN, first-seen window, port), scored by
+        weighted overlap - not from a scan of the graph.
+        """
+        with tracer.span("correlate"):
+            # Loading / re-syncing the threat cache stays off the event loop
+            related = await asyncio.get_running_loop().run_in_executor(None, correlate_ioc, ioc)
         
-        return correlated
+        return {
+            "related_threats": related,
+            "confidence": related[0]["score"] if related else 0.0
+        }
     
     def _generate_final_report(self, ioc, all_data):
         """Generate the final intelligence report"""
@@ -351,6 +399,8 @@ class ShadowCoreOrchestrator:
         # Count successful steps
         successful_steps = len([s for s in all_data["pipeline"] if "status" in s["result"] and s["result"]["status"] != "failed"])
         total_steps = len(all_data["pipeline"])
+        correlation = next((s["result"] for s in all_data["pipeline"] if s["step"] == "memory_correlate"), {})
+        stages = all_data.get("stages", {})
         
         return {
             "ioc": ioc,
@@ -361,24 +411,13 @@ class ShadowCoreOrchestrator:
                 "summary": f"Analysis complete via {successful_steps}/{total_steps} pipeline steps"
             },
             "actions_recommended": ["Monitor", "Investigate further"],
-            "correlation_score": all_data["pipeline"][-1]["result"].get("confidence", 0.0),
+            "correlation_score": correlation.get("confidence", 0.0),
             "report_id": f"REPORT-{int(time.time())}-{hash(ioc) % 10000:04d}",
-            "pipeline_summary": f"{successful_steps}/{total_steps} steps successful"
+            "pipeline_summary": f"{successful_steps}/{total_steps} steps successful",
+            "stages_completed": stages.get("completed", PIPELINE_STEPS),
+            "partial": bool(stages.get("skipped"))
         }
     
-    def _detect_ioc_type(self, ioc):
-        """Simple IOC type detection"""
-        if ioc.count('.') == 3 and all(part.isdigit() for part in ioc.split('.')):
-            return "ip"
-        elif '.' in ioc and not ioc.startswith('http'):
-            return "domain"
-        elif ioc.startswith('http'):
-            return "url"
-        elif len(ioc) in [32, 40, 64] and all(c in '0123456789abcdefABCDEF' for c in ioc):
-            return "hash"
-        else:
-            return "unknown"
-
 async def run_demo():
     """Run a demonstration of your complete system"""
     print("\n" + "=" * 60)
@@ -438,6 +477,9 @@ async def run_demo():
                 "reports": all_reports
             }, f, indent=2)
         
+        # Individual reports go to the indexed store (dashboard, lookups)
+        ReportStore().append(all_reports)
+        
         print(f"\n💾 All reports saved to: {report_file}")
     
     # Summary
@@ -454,6 +496,18 @@ async def run_demo():
     
     print(f"\n📈 Results: {len(all_reports)}/{len(test_cases)} IOCs successfully analyzed")
     
+    down = orchestrator.dependency_health()["open"]
+    if down:
+        print(f"   ⚡ Skipped (circuit open): {', '.join(down)}")
+    
+    enrichment = orchestrator.enrichment_stats()["total"]
+    print(f"   🗃️  Enrichment cache: {enrichment['hit_rate']:.0%} hit rate "
+          f"({enrichment['lookups']} lookups, {enrichment['misses']} misses)")
+    llm = orchestrator.llm.snapshot()
+    print(f"   🦙 LLM stage: {llm['generate_calls']} generate calls for {llm['requests']} IOCs "
+          f"({llm['cache_hits']} cached, avg batch {llm['batching']['avg_batch']})")
+    await orchestrator.close()
+    
     print("\n🚀 Next steps to make it even better:")
     print("   1. Connect real threat feeds to OSINT Engine")
     print("   2. Train shadowbrain with actual malware patterns")
@@ -475,6 +529,7 @@ async def quick_test():
     # Test one IOC
     print("\nTesting with: 192.168.1.100")
     result = await orchestrator.process_ioc("192.168.1.100")
+    await orchestrator.close()
     
     if result and "report" in result:
         print(f"✅ SUCCESS!")
@@ -11,6 +11,8 @@ import redis
 from neo4j import GraphDatabase
 import os
 
+from threat_cache import load_threat_cache
+
 print("🔧 SHADOWCORE FIXED ORCHESTRATOR")
 print("=" * 60)
 print("Now properly checking REAL threat feeds")
@@ -37,14 +39,8 @@ class FixedShadowCoreOrchestrator:
     
     def load_threat_cache(self):
         """Load threat cache from feed processor"""
-        cache_file = "/opt/shadowcore/feeds/processed/threat_cache.json"
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file) as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"  ❌ Error loading cache: {e}")
-        return {}
+        cache_file, cache = load_threat_cache("/opt/shadowcore/feeds/processed/threat_cache.json")
+        return cache
     
     def check_threat_feeds(self, ioc):
         """Check if IOC exists in threat feeds (improved matching)"""
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Offline IP -> ASN / country / org range index
+
+Builds a local enrichment index from a downloadable range dump such as
+iptoasn.com's ip2asn-v4.tsv (range_start, range_end, AS_number,
+country_code, AS_description) or any CSV export of an MMDB with the same
+columns. Ranges are stored as sorted uint32 interval arrays on disk and
+memory-mapped at load time, so every worker shares the same pages and a
+lookup is a binary search - no external API calls or rate limits.
+
+Usage:
+    python3 geo_index.py build /opt/shadowcore/feeds/geo/ip2asn-v4.tsv
+    python3 geo_index.py lookup 185.130.5.253 8.8.8.8
+"""
+import bisect
+import csv
+import gzip
+import ipaddress
+import json
+import mmap
+import os
+import sys
+from array import array
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_INDEX_DIR = "/opt/shadowcore/feeds/geo/index"
+COLUMNS = ('starts', 'ends', 'asns', 'countries', 'orgs')
+UNKNOWN = {'asn': None, 'country': 'Unknown', 'org': 'Unknown ISP'}
+
+
+def _ip_to_int(value):
+    """IPv4 string (or already-int) to uint32, None if not IPv4"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(ipaddress.IPv4Address(value.strip()))
+    except (ipaddress.AddressValueError, ValueError, AttributeError):
+        return None
+
+
+def _open_dump(path):
+    """Open a plain or gzipped CSV/TSV dump"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def build_index(dump_file, index_dir=DEFAULT_INDEX_DIR):
+    """Compile a range dump into sorted interval arrays on disk"""
+    rows = []
+    with _open_dump(dump_file) as f:
+        sample = f.readline()
+        f.seek(0)
+        delimiter = '\t' if '\t' in sample else ','
+        for parts in csv.reader(f, delimiter=delimiter):
+            if len(parts) < 3 or parts[0].startswith('#'):
+                continue
+            start, end = _ip_to_int(parts[0]), _ip_to_int(parts[1])
+            if start is None or end is None or end < start:
+                continue  # header line or IPv6 range
+            asn = parts[2].strip().upper().replace('AS', '')
+            asn = int(asn) if asn.isdigit() else 0
+            if asn == 0:
+                continue  # "Not routed" ranges carry no information
+            country = parts[3].strip() if len(parts) > 3 else ''
+            org = parts[4].strip() if len(parts) > 4 else ''
+            rows.append((start, end, asn, country, org))
+
+    rows.sort()
+    countries, orgs = [], []
+    country_codes, org_codes = {}, {}
+    columns = {name: array('I') for name in COLUMNS}
+    for start, end, asn, country, org in rows:
+        # Skip ranges overlapping the previous one so intervals stay disjoint
+        if columns['ends'] and start <= columns['ends'][-1]:
+            continue
+        columns['starts'].append(start)
+        columns['ends'].append(end)
+        columns['asns'].append(asn)
+        if country not in country_codes:
+            country_codes[country] = len(countries)
+            countries.append(country)
+        if org not in org_codes:
+            org_codes[org] = len(orgs)
+            orgs.append(org)
+        columns['countries'].append(country_codes[country])
+        columns['orgs'].append(org_codes[org])
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name, column in columns.items():
+        # Native byte order: the index is built on the host that serves it
+        with open(os.path.join(index_dir, f"{name}.u32"), 'wb') as f:
+            column.tofile(f)
+    with open(os.path.join(index_dir, 'strings.json'), 'w') as f:
+        json.dump({'countries': countries, 'orgs': orgs, 'source': os.path.basename(dump_file),
+                   'ranges': len(columns['starts'])}, f)
+
+    return len(columns['starts'])
+
+
+class GeoRangeIndex:
+    """Memory-mapped IPv4 range index with binary-search lookups"""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self._maps = {}
+        self._columns = {}
+        self._arrays = {}
+
+        with open(os.path.join(index_dir, 'strings.json')) as f:
+            strings = json.load(f)
+        self.countries = strings['countries']
+        self.orgs = strings['orgs']
+        self.source = strings.get('source')
+
+        for name in COLUMNS:
+            path = os.path.join(index_dir, f"{name}.u32")
+            if os.path.getsize(path) == 0:
+                self._columns[name] = array('I')
+                continue
+            with open(path, 'rb') as f:
+                self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._columns[name] = memoryview(self._maps[name]).cast('I')
+            if NUMPY_AVAILABLE:
+                self._arrays[name] = np.frombuffer(self._maps[name], dtype=np.uint32)
+
+    def __len__(self):
+        return len(self._columns['starts'])
+
+    def _record(self, i):
+        """Build the enrichment record for range i"""
+        return {
+            'asn': self._columns['asns'][i],
+            'country': self.countries[self._columns['countries'][i]] or 'Unknown',
+            'org': self.orgs[self._columns['orgs'][i]] or 'Unknown ISP',
+        }
+
+    def _find(self, ip_int):
+        """Index of the range containing ip_int, or -1"""
+        if ip_int is None:
+            return -1
+        i = bisect.bisect_right(self._columns['starts'], ip_int) - 1
+        if i >= 0 and ip_int <= self._columns['ends'][i]:
+            return i
+        return -1
+
+    def lookup(self, ip):
+        """Look up one IPv4 address"""
+        i = self._find(_ip_to_int(ip))
+        return self._record(i) if i >= 0 else dict(UNKNOWN)
+
+    def lookup_batch(self, ips):
+        """Look up many addresses with one vectorized search"""
+        ip_ints = [_ip_to_int(ip) for ip in ips]
+        if not NUMPY_AVAILABLE or not self._arrays:
+            return [self._record(i) if i >= 0 else dict(UNKNOWN) for i in map(self._find, ip_ints)]
+
+        valid = np.array([v is not None for v in ip_ints], dtype=bool)
+        values = np.array([v if v is not None else 0 for v in ip_ints], dtype=np.uint32)
+        idx = np.searchsorted(self._arrays['starts'], values, side='right') - 1
+        hit = valid & (idx >= 0)
+        hit[hit] &= values[hit] <= self._arrays['ends'][idx[hit]]
+        return [self._record(int(i)) if ok else dict(UNKNOWN) for i, ok in zip(idx, hit)]
+
+    def close(self):
+        """Release the memory maps"""
+        for column in self._columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self._columns.clear()
+        self._arrays.clear()
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
+
+
+_shared_index = None
+
+
+def get_geo_index(index_dir=DEFAULT_INDEX_DIR):
+    """Shared per-process index, None if it has not been built yet"""
+    global _shared_index
+    if _shared_index is None and os.path.exists(os.path.join(index_dir, 'strings.json')):
+        _shared_index = GeoRangeIndex(index_dir)
+    return _shared_index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "build":
+        index_dir = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_INDEX_DIR
+        count = build_index(sys.argv[2], index_dir)
+        print(f"✅ Geo/ASN index built: {count} ranges -> {index_dir}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "lookup":
+        index = get_geo_index()
+        if index is None:
+            print(f"❌ No index at {DEFAULT_INDEX_DIR} - run: geo_index.py build <dump>")
+            sys.exit(1)
+        for ip, record in zip(sys.argv[2:], index.lookup_batch(sys.argv[2:])):
+            print(f"  {ip:18} AS{record['asn'] or '?':<8} {record['country']:8} {record['org']}")
+    else:
+        print("Usage: geo_index.py build <ip2asn.tsv|csv[.gz]> [index_dir]")
+        print("       geo_index.py lookup <ip> [<ip> ...]")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Batched knowledge-graph reads and writes for IOCs
+
+Both operations take a list and cost one round trip however many IOCs
+are in it; a single IOC is just a batch of one.
+
+    found = await lookup_iocs(driver, ["1.2.3.4", "evil.com"])
+    # {"1.2.3.4": {"relations": 3, "related_entities": [["Malware"]]}}
+
+    summary = await upsert_iocs(driver, [row, ...])
+    # {"1.2.3.4": {"created": True, "relations": 0, "related_entities": []}}
+
+upsert_iocs is an idempotent MERGE. It creates missing IOC nodes, leaves
+existing ones untouched and returns each IOC's relation summary in the
+same query, so there is no separate check before the write.
+"""
+import time
+
+from tracing import tracer
+
+LOOKUP_QUERY = """
+UNWIND $iocs AS ioc
+MATCH (i:IOC {value: ioc})
+OPTIONAL MATCH (i)-[r]-(related)
+RETURN i.value AS ioc,
+       COUNT(r) AS relations,
+       COLLECT(DISTINCT labels(related)) AS related_labels
+"""
+
+# first_seen is only written on create, so comparing it with this batch's
+# timestamp tells new nodes from existing ones
+UPSERT_QUERY = """
+UNWIND $rows AS row
+MERGE (i:IOC {value: row.ioc})
+ON CREATE SET i.type = row.type,
+              i.threat_level = row.threat_level,
+              i.source = row.source,
+              i.first_seen = $now,
+              i.last_updated = $now,
+              i.confidence = row.confidence,
+              i.malware = row.malware
+WITH i, i.first_seen = $now AS created
+OPTIONAL MATCH (i)-[r]-(related)
+RETURN i.value AS ioc,
+       created,
+       COUNT(r) AS relations,
+       COLLECT(DISTINCT labels(related)) AS related_labels
+"""
+
+
+def graph_row(ioc, report):
+    """Upsert parameters for one analysis report"""
+    threat_data = report.get('threat_data', {})
+    return {
+        'ioc': ioc,
+        'type': threat_data.get('type', 'unknown'),
+        'threat_level': report['threat_assessment']['level'],
+        'source': threat_data.get('source', 'unknown'),
+        'confidence': report['threat_assessment']['confidence'],
+        'malware': threat_data.get('malware', ''),
+    }
+
+
+async def lookup_iocs(driver, iocs):
+    """{ioc: relation summary} for the IOCs present in the graph"""
+    if not iocs:
+        return {}
+    with tracer.span("neo4j_lookup_batch", kind="dependency", size=len(iocs)):
+        async with driver.session() as session:
+            result = await session.run(LOOKUP_QUERY, iocs=list(iocs))
+            return {
+                record['ioc']: {
+                    'relations': record['relations'],
+                    'related_entities': record['related_labels']
+                } async for record in result
+            }
+
+
+async def upsert_iocs(driver, rows):
+    """Merge IOC rows (see graph_row) and return {ioc: summary incl. created}"""
+    if not rows:
+        return {}
+    with tracer.span("neo4j_upsert_batch", kind="dependency", size=len(rows)):
+        async with driver.session() as session:
+            result = await session.run(UPSERT_QUERY, rows=rows, now=int(time.time() * 1000))
+            return {
+                record['ioc']: {
+                    'created': record['created'],
+                    'relations': record['relations'],
+                    'related_entities': record['related_labels']
+                } async for record in result
+            }
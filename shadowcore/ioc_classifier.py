@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+ShadowCore IOC classifier - refang, canonicalize and type in one pass
+
+    classify("hxxps://Evil[.]com/Path")   # ('https://evil.com/Path', 'url')
+    classify("cdn77[.]org")               # ('cdn77.org', 'domain')
+    classify_many(lines)                  # [(value, type), ...] in input order
+
+Types, tried in this order so a URL is never mistaken for a domain:
+
+  url        scheme://host...      scheme and host lower-cased, path kept
+                                   (a missing or malformed host is unknown)
+  email      user@domain           lower-cased
+  cidr       1.2.3.0/24, 2001:db8::/32   network address, strict=False
+  ip_port    1.2.3.4:8080, [2001:db8::1]:443
+  ip         IPv4 (octets 0-255, no leading zeros)
+  ipv6       any form ipaddress accepts, in compressed form
+  hash       32 / 40 / 64 hex digits (MD5 / SHA-1 / SHA-256), lower-cased
+  domain     labels + alphabetic TLD, lower-cased, trailing dot dropped
+  unknown    everything else, stripped but otherwise unchanged
+
+The canonical value is what callers should key caches, single-flight and
+feed lookups on. classify() is memoized; classify_many() runs the refang
+substitution and the type regex once over the whole batch.
+"""
+import ipaddress
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# Common defanging styles: hxxp, [.], (.), {.}, [dot], [:], [at], [@]
+_REFANG = re.compile(r'\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\)|\[:\]|\[://\]|\[at\]|\(at\)|\[@\]|^hxxp|^fxp',
+                     re.IGNORECASE | re.MULTILINE)
+_REFANG_MAP = {'[.]': '.', '(.)': '.', '{.}': '.', '[dot]': '.', '(dot)': '.', '[:]': ':',
+               '[://]': '://', '[at]': '@', '(at)': '@', '[@]': '@', 'hxxp': 'http', 'fxp': 'ftp'}
+
+_OCTET = r'(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+_IPV4 = rf'{_OCTET}(?:\.{_OCTET}){{3}}'
+_IPV6 = r'[0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7}(?:%\w+)?'
+_DOMAIN = r'(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9])?\.)+(?:[A-Za-z]{2,63}|xn--[A-Za-z0-9-]{1,59})\.?'
+_PORT = r'(?:6553[0-5]|655[0-2]\d|65[0-4]\d\d|6[0-4]\d{3}|[1-5]\d{4}|[1-9]\d{0,3})'
+
+# One alternation, anchored per line; the first group that matches wins
+_LINE = re.compile(
+    rf'^[ \t]*(?:'
+    rf'(?P<url>[A-Za-z][A-Za-z0-9+.-]*://\S+)'
+    rf'|(?P<email>[A-Za-z0-9._%+-]+@{_DOMAIN})'
+    rf'|(?P<cidr>(?:{_IPV4}|{_IPV6})/\d{{1,3}})'
+    rf'|(?P<ip_port>(?:{_IPV4}|\[{_IPV6}\]):{_PORT})'
+    rf'|(?P<ip>{_IPV4})'
+    rf'|(?P<ipv6>{_IPV6})'
+    rf'|(?P<hash>[0-9A-Fa-f]{{64}}|[0-9A-Fa-f]{{40}}|[0-9A-Fa-f]{{32}})'
+    rf'|(?P<domain>{_DOMAIN})'
+    rf'|(?P<unknown>.*?)'
+    rf')[ \t]*$',
+    re.MULTILINE,
+)
+
+IOC_TYPES = ('url', 'email', 'cidr', 'ip_port', 'ip', 'ipv6', 'hash', 'domain', 'unknown')
+
+
+def refang(text):
+    """Undo common defanging (hxxp, [.], [at], ...)"""
+    return _REFANG.sub(lambda m: _REFANG_MAP[m.group(0).lower()], text)
+
+
+def _canonical(value, ioc_type):
+    """Canonical form for a regex match; may demote to 'unknown'"""
+    if ioc_type in ('email', 'hash'):
+        return value.lower(), ioc_type
+    if ioc_type == 'domain':
+        return value.lower().rstrip('.'), ioc_type
+    if ioc_type == 'url':
+        try:
+            if not urlsplit(value).hostname:
+                return value, 'unknown'
+        except ValueError:  # e.g. an unclosed "[" IPv6 host
+            return value, 'unknown'
+        scheme, _, rest = value.partition('://')
+        host, sep, path = rest.partition('/')
+        return f"{scheme.lower()}://{host.lower()}{sep}{path}", ioc_type
+    if ioc_type == 'ipv6':
+        try:
+            return str(ipaddress.IPv6Address(value)), ioc_type
+        except ValueError:
+            return value, 'unknown'
+    if ioc_type == 'cidr':
+        try:
+            return str(ipaddress.ip_network(value, strict=False)), ioc_type
+        except ValueError:
+            return value, 'unknown'
+    if ioc_type == 'ip_port' and value.startswith('['):
+        host, _, port = value[1:].rpartition(']:')
+        try:
+            return f"[{ipaddress.IPv6Address(host)}]:{port}", ioc_type
+        except ValueError:
+            return value, 'unknown'
+    return value, ioc_type
+
+
+def _from_match(match):
+    ioc_type = match.lastgroup
+    return _canonical(match.group(ioc_type), ioc_type)
+
+
+@lru_cache(maxsize=65536)
+def classify(raw):
+    """(canonical value, type) for one IOC string"""
+    return _from_match(_LINE.match(refang(raw.strip())))
+
+
+def classify_many(raws):
+    """classify() for a batch, in input order
+
+    The batch is joined into one string, so refanging and typing each run
+    once over it in C; only the per-match canonicalization is Python.
+    Inputs containing newlines are classified individually.
+    """
+    raws = [str(raw).strip() for raw in raws]
+    if not raws:
+        return []
+    if any('\n' in raw or '\r' in raw for raw in raws):
+        return [classify(raw) for raw in raws]
+    text = refang('\n'.join(raws))
+    return [_from_match(match) for match in _LINE.finditer(text)]
+
+
+def normalize_ioc(raw):
+    """Canonical value only"""
+    return classify(raw)[0]
+
+
+def ioc_type(raw):
+    """Type only (see IOC_TYPES)"""
+    return classify(raw)[1]
+
+
+if __name__ == "__main__":
+    import sys
+
+    lines = sys.argv[1:] or [line.rstrip('\n') for line in sys.stdin]
+    for (value, kind), raw in zip(classify_many(lines), lines):
+        print(f"{kind:8} {value:45} <- {raw}")
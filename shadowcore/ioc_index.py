@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Compact IOC match structures shared by block- and allowlists
+
+  * BloomFilter - fixed-size bit array for fast "definitely not present"
+    checks on exact IOC values
+  * DomainTrie  - label trie over reversed domain names, so an entry for
+    example.com also covers www.example.com
+  * CIDRSet     - merged, sorted IPv4/IPv6 intervals searched with bisect
+"""
+import bisect
+import hashlib
+import ipaddress
+import math
+
+
+class BloomFilter:
+    """Bloom filter sized for an expected item count and error rate"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        """Double hashing over one blake2b digest"""
+        digest = hashlib.blake2b(item.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+class DomainTrie:
+    """Suffix match of domains via a trie of reversed labels"""
+
+    _END = '$'
+
+    def __init__(self):
+        self.root = {}
+        self.count = 0
+
+    @staticmethod
+    def _labels(domain):
+        return reversed(domain.strip().strip('.').lower().split('.'))
+
+    def add(self, domain, value=True):
+        node = self.root
+        for label in self._labels(domain):
+            node = node.setdefault(label, {})
+        if self._END not in node:
+            self.count += 1
+        node[self._END] = value
+
+    def match(self, domain):
+        """Value of the most specific entry covering domain, or None"""
+        node = self.root
+        found = None
+        for label in self._labels(domain):
+            node = node.get(label)
+            if node is None:
+                break
+            if self._END in node:
+                found = node[self._END]
+        return found
+
+    def __contains__(self, domain):
+        return self.match(domain) is not None
+
+    def __len__(self):
+        return self.count
+
+
+class CIDRSet:
+    """IP network membership over sorted, merged intervals"""
+
+    def __init__(self):
+        self._pending = {4: [], 6: []}
+        self._starts = {4: [], 6: []}
+        self._ends = {4: [], 6: []}
+        self._values = {4: [], 6: []}
+        self.count = 0
+
+    def add(self, network, value=True):
+        """Add an address or network (e.g. '10.0.0.0/8'); returns False if invalid"""
+        try:
+            net = ipaddress.ip_network(network.strip(), strict=False)
+        except ValueError:
+            return False
+        self._pending[net.version].append((int(net.network_address), int(net.broadcast_address), value))
+        self.count += 1
+        return True
+
+    def _compile(self, version):
+        """Merge pending networks into disjoint sorted intervals"""
+        intervals = sorted(self._pending[version] + list(zip(
+            self._starts[version], self._ends[version], self._values[version])))
+        starts, ends, values = [], [], []
+        for start, end, value in intervals:
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+                values.append(value)
+        self._starts[version], self._ends[version], self._values[version] = starts, ends, values
+        self._pending[version] = []
+
+    def match(self, ip):
+        """Value for the interval containing ip, or None"""
+        try:
+            addr = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            return None
+        version = addr.version
+        if self._pending[version]:
+            self._compile(version)
+        value = int(addr)
+        i = bisect.bisect_right(self._starts[version], value) - 1
+        if i >= 0 and value <= self._ends[version][i]:
+            return self._values[version][i]
+        return None
+
+    def __contains__(self, ip):
+        return self.match(ip) is not None
+
+    def __len__(self):
+        return self.count
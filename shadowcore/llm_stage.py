@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+ShadowCore LLM stage - batched, cached, streaming Ollama analysis
+
+    llm = OllamaStage("http://localhost:11434", model="llama2")
+    result = await llm.analyze("23.95.44.80", context=worker_output)
+    # {'verdict': 'malicious', 'reason': '...', 'response': '...', 'batch_size': 3, ...}
+
+- Batching: IOCs submitted within max_wait of each other (up to
+  max_batch) go out as one prompt asking for one "ioc | verdict | reason"
+  line each. The answer is split back per IOC; IOCs the model left out
+  are asked again with their own single-IOC prompt, so no IOC is handed
+  another IOC's text.
+- Caching: parsed verdicts are kept for cache_ttl (24 h, the enrichment
+  cache's Ollama TTL) in an LRU keyed by model + SHA-256 of the
+  single-IOC prompt, so a repeated IOC is answered without the model no
+  matter which batch it first arrived in. Concurrent identical requests
+  share one call. Partial or unparsed answers are returned but never
+  cached.
+- Streaming: /api/generate is called with stream=true. Tokens reach
+  on_token(iocs, token) as they arrive (e.g. WebSocketTokenFeed for the
+  :8083 feed), and the time limit is per token (idle_timeout), not for the
+  whole answer. A stream that stalls after producing text returns what
+  it has, with partial=True.
+- Concurrency: at most max_concurrency generate calls hit the model server
+  at once; further batches queue. The "ollama" circuit breaker is shared
+  with the rest of the orchestrator.
+
+ollama_stub.py serves the same HTTP API locally for tests and benchmarks.
+"""
+import asyncio
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from circuit_breaker import CircuitOpenError, breakers
+from enrichment_cache import SOURCE_TTLS
+from ioc_classifier import normalize_ioc
+from micro_batch import MicroBatcher
+from single_flight import SingleFlight
+
+OLLAMA_URL = os.environ.get('SHADOWCORE_OLLAMA_URL', 'http://localhost:11434')
+MODEL = os.environ.get('SHADOWCORE_OLLAMA_MODEL', 'llama2')
+MAX_CONCURRENCY = int(os.environ.get('SHADOWCORE_OLLAMA_CONCURRENCY', '2'))
+MAX_BATCH = 8
+MAX_WAIT = 0.02
+IDLE_TIMEOUT = 10.0
+TOTAL_TIMEOUT = 120.0
+CACHE_SIZE = 4096
+CACHE_TTL = SOURCE_TTLS['ollama']
+
+VERDICTS = ('malicious', 'suspicious', 'benign')
+
+
+def single_prompt(ioc, context=''):
+    prompt = f"Analyze this threat IOC: {ioc}\n"
+    if context:
+        prompt += f"Context: {context}\n"
+    return prompt + "Answer on one line as: <ioc> | <malicious, suspicious or benign> | <short reason>"
+
+
+def batch_prompt(items):
+    lines = ["Analyze each threat IOC below. Answer with exactly one line per IOC as:",
+             "<ioc> | <malicious, suspicious or benign> | <short reason>", ""]
+    for n, (ioc, context) in enumerate(items, 1):
+        lines.append(f"{n}. {ioc}" + (f" (context: {context})" if context else ""))
+    return '\n'.join(lines)
+
+
+def prompt_key(model, prompt):
+    return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+
+def parse_verdicts(text):
+    """{normalized ioc: (verdict, reason, line)} from "ioc | verdict | reason" lines"""
+    found = {}
+    for line in text.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) < 2:
+            continue
+        head = parts[0].lstrip('-*• ')
+        number, dot, rest = head.partition('. ')
+        if dot and number.isdigit():
+            head = rest
+        verdict = parts[1].lower()
+        verdict = next((v for v in VERDICTS if v in verdict), 'unknown')
+        found[normalize_ioc(head)] = (verdict, parts[2] if len(parts) > 2 else '', line.strip())
+    return found
+
+
+def _context_text(context):
+    if context is None or context == '':
+        return ''
+    if isinstance(context, str):
+        return context
+    return json.dumps(context, sort_keys=True, default=str)
+
+
+class OllamaStage:
+    """Micro-batched, cached, streaming client for Ollama /api/generate"""
+
+    def __init__(self, base_url=OLLAMA_URL, model=MODEL, max_concurrency=MAX_CONCURRENCY,
+                 max_batch=MAX_BATCH, max_wait=MAX_WAIT, idle_timeout=IDLE_TIMEOUT,
+                 total_timeout=TOTAL_TIMEOUT, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL, on_token=None):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.idle_timeout = idle_timeout
+        self.total_timeout = total_timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.on_token = on_token
+        self.cache = OrderedDict()
+        self.batcher = MicroBatcher(self._run_batch, max_batch=max_batch, max_wait=max_wait)
+        self.flights = SingleFlight()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'generate_calls': 0, 'tokens': 0,
+                      'partial': 0, 'unparsed': 0, 'retries': 0, 'errors': 0, 'max_active': 0}
+        self._slots = None
+        self._active = 0
+
+    async def analyze(self, ioc, context=None):
+        """LLM verdict for one IOC (batched with concurrent calls)"""
+        self.stats['requests'] += 1
+        ioc = normalize_ioc(ioc)
+        context = _context_text(context)
+        key = prompt_key(self.model, single_prompt(ioc, context))
+        cached = self._cached(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return dict(cached, cached=True)
+        return await self.flights.do(key, lambda: self.batcher.submit((ioc, context, key)))
+
+    async def _run_batch(self, items):
+        if len(items) == 1:
+            ioc, context, key = items[0]
+            return [await self._run_single(ioc, context, key)]
+
+        started = time.perf_counter()
+        text, partial = await self._generate(batch_prompt([(ioc, context) for ioc, context, _ in items]),
+                                             [ioc for ioc, _, _ in items])
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        verdicts = parse_verdicts(text)
+        results = [None] * len(items)
+        missing = []
+        for n, (ioc, context, key) in enumerate(items):
+            if ioc in verdicts:
+                verdict, reason, line = verdicts[ioc]
+                results[n] = self._result(verdict, reason, line, partial, len(items), elapsed_ms)
+                if not partial:
+                    self._remember(key, results[n])
+            elif partial:
+                # The stream stalled before reaching this IOC
+                results[n] = self._result('unknown', '', '', True, len(items), elapsed_ms)
+            else:
+                missing.append(n)
+
+        if missing:
+            # Left out of the batch answer: ask for each on its own
+            self.stats['retries'] += len(missing)
+            retried = await asyncio.gather(*(self._run_single(*items[n]) for n in missing),
+                                           return_exceptions=True)
+            for n, result in zip(missing, retried):
+                if isinstance(result, Exception):
+                    result = dict(self._result('unknown', '', '', False, 1, 0.0), error=str(result)[:100])
+                results[n] = result
+        return results
+
+    async def _run_single(self, ioc, context, key):
+        started = time.perf_counter()
+        text, partial = await self._generate(single_prompt(ioc, context), [ioc])
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        verdicts = parse_verdicts(text)
+        parsed = verdicts.get(ioc)
+        if parsed is None and len(verdicts) == 1:
+            # The only verdict line answers the only IOC asked about
+            parsed = next(iter(verdicts.values()))
+        if parsed is None:
+            self.stats['unparsed'] += 1
+            return self._result('unknown', '', text, partial, 1, elapsed_ms)
+        result = self._result(*parsed, partial, 1, elapsed_ms)
+        if not partial:
+            self._remember(key, result)
+        return result
+
+    def _result(self, verdict, reason, response, partial, batch_size, elapsed_ms):
+        return {
+            'model': self.model,
+            'verdict': verdict,
+            'reason': reason,
+            'response': response,
+            'done': not partial,
+            'partial': partial,
+            'batch_size': batch_size,
+            'elapsed_ms': elapsed_ms,
+            'cached': False,
+        }
+
+    def _cached(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        result, expires = entry
+        if expires <= time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return result
+
+    def _remember(self, key, result):
+        self.cache[key] = (result, time.monotonic() + self.cache_ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _generate(self, prompt, iocs):
+        """Stream one /api/generate call; returns (text, partial)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        breaker = breakers.get('ollama')
+        async with self._slots:
+            permit = breaker.allow()
+            if not permit:
+                raise CircuitOpenError('ollama')
+            self._active += 1
+            self.stats['max_active'] = max(self.stats['max_active'], self._active)
+            self.stats['generate_calls'] += 1
+            tokens = []
+            try:
+                timeout = aiohttp.ClientTimeout(total=self.total_timeout, sock_read=self.idle_timeout)
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.post(f"{self.base_url}/api/generate", json={
+                        'model': self.model, 'prompt': prompt, 'stream': True
+                    }) as resp:
+                        if resp.status != 200:
+                            raise RuntimeError(f"ollama HTTP {resp.status}")
+                        async for line in resp.content:
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get('error'):
+                                raise RuntimeError(f"ollama: {chunk['error']}")
+                            token = chunk.get('response', '')
+                            if token:
+                                tokens.append(token)
+                                self.stats['tokens'] += 1
+                                await self._emit(iocs, token)
+                            if chunk.get('done'):
+                                break
+                breaker.record_success()
+                return ''.join(tokens), False
+            except (asyncio.TimeoutError, aiohttp.ClientPayloadError) as e:
+                if tokens:
+                    # Keep the reasoning that made it out before the stall
+                    breaker.record_success()
+                    self.stats['partial'] += 1
+                    return ''.join(tokens), True
+                breaker.record_failure(e)
+                self.stats['errors'] += 1
+                raise
+            except Exception as e:
+                breaker.record_failure(e)
+                self.stats['errors'] += 1
+                raise
+            finally:
+                breaker.release(permit)
+                self._active -= 1
+
+    async def _emit(self, iocs, token):
+        if self.on_token is None:
+            return
+        try:
+            result = self.on_token(iocs, token)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            pass  # a broken listener must not break the analysis
+
+    async def close(self):
+        close = getattr(self.on_token, 'close', None)
+        if close is not None:
+            await close()
+
+    def snapshot(self):
+        stats = dict(self.stats, cached_results=len(self.cache), active=self._active,
+                     max_concurrency=self.max_concurrency, batching=self.batcher.snapshot())
+        stats['cache_hit_rate'] = round(stats['cache_hits'] / stats['requests'], 3) if stats['requests'] else 0.0
+        return stats
+
+
+class WebSocketTokenFeed:
+    """on_token sink that forwards tokens to the WebSocket feed
+
+    Publishes {"type": "broadcast", "event": {"type": "llm_token", "iocs":
+    [...], "token": "..."}} so the :8083 server fans each token out to the
+    other connected clients (core/websocket_production.py). Tokens go
+    through a bounded queue to one sender task, so the analysis never
+    waits on the socket: when the queue is full, a send takes longer than
+    send_timeout or the feed is unreachable, tokens are dropped. Reconnects
+    are attempted at most every retry_after seconds, and whatever the
+    server sends back (including other publishers' broadcasts) is read
+    and discarded.
+    """
+
+    def __init__(self, url="ws://localhost:8083", retry_after=30.0, queue_size=1024, send_timeout=1.0):
+        self.url = url
+        self.retry_after = retry_after
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.sent = 0
+        self.dropped = 0
+        self._queue = None
+        self._sender = None
+        self._reader = None
+        self._session = None
+        self._ws = None
+        self._down_until = 0.0
+
+    def __call__(self, iocs, token):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._sender = asyncio.ensure_future(self._send_loop())
+        try:
+            self._queue.put_nowait({'type': 'broadcast',
+                                    'event': {'type': 'llm_token', 'iocs': iocs, 'token': token}})
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _connect(self):
+        if self._ws is not None and not self._ws.closed:
+            return self._ws
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            self._ws = await self._session.ws_connect(self.url, timeout=2)
+            self._reader = asyncio.ensure_future(self._drain(self._ws))
+            return self._ws
+        except Exception:
+            self._down_until = time.monotonic() + self.retry_after
+            return None
+
+    async def _drain(self, ws):
+        """Read and discard server messages so they never pile up"""
+        try:
+            async for _ in ws:
+                pass
+        except Exception:
+            pass
+
+    async def _send_loop(self):
+        while True:
+            message = await self._queue.get()
+            ws = await self._connect()
+            if ws is None:
+                self.dropped += 1
+                continue
+            try:
+                await asyncio.wait_for(ws.send_json(message), self.send_timeout)
+                self.sent += 1
+            except Exception:
+                self.dropped += 1
+                self._ws = None
+                self._down_until = time.monotonic() + self.retry_after
+                with contextlib.suppress(Exception):
+                    await ws.close()
+
+    async def close(self):
+        for task in (self._sender, self._reader):
+            if task is not None:
+                task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+        if self._session is not None:
+            await self._session.close()
+        self._ws = self._session = self._sender = self._reader = None
+        self._queue = None
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-batching of concurrent single-item calls
+
+    batcher = MicroBatcher(lookup_many, max_batch=256, max_wait=0.002)
+    info = await batcher.submit(ioc)
+
+Calls that arrive within max_wait of each other (or in the same event-loop
+tick when max_wait is 0) are handed to the handler as one list. The handler
+returns either a list of results in input order or a dict keyed by item;
+items missing from a dict get None.
+"""
+import asyncio
+
+
+class MicroBatcher:
+    """Coalesces submit() calls into batched handler calls"""
+
+    def __init__(self, handler, max_batch=256, max_wait=0.0):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = {'items': 0, 'batches': 0, 'max_batch': 0}
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            if self.max_wait > 0:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+            else:
+                self._timer = loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        self.stats['items'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if isinstance(results, dict):
+            results = [results.get(item) for item, _ in batch]
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats['avg_batch'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
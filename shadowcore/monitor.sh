@@ -39,7 +39,7 @@ else
     echo "Known threats: 0"
 fi
 
-REPORT_COUNT=$(ls /opt/shadowcore/intelligence_reports/*.json 2>/dev/null | wc -l)
+REPORT_COUNT=$(python3 /opt/shadowcore/report_store.py stats 2>/dev/null | python3 -c "import json,sys; print(json.load(sys.stdin)['reports'])" 2>/dev/null || echo 0)
 echo "Analysis reports: $REPORT_COUNT"
 
 # Recent Threats
@@ -71,6 +71,6 @@ echo "----------------"
 echo "1. View Dashboard: http://localhost:8020"
 echo "2. Analyze IOC:    python3 /opt/shadowcore/clean_orchestrator_fixed.py"
 echo "3. Update Feeds:   python3 /opt/shadowcore/clean_feed_manager.py"
-echo "4. View Reports:   ls -la /opt/shadowcore/intelligence_reports/"
+echo "4. View Reports:   python3 /opt/shadowcore/report_store.py latest 10"
 echo ""
 echo "✅ System monitoring complete"
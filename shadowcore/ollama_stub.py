@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Ollama HTTP API for tests and benchmarks
+
+Implements the endpoints ShadowCore uses:
+
+  GET  /              "Ollama is running"
+  GET  /api/tags      one model entry per --models name
+  POST /api/generate  streamed NDJSON chunks (default) or one JSON body
+                      when "stream": false, like the real server
+
+Answers are deterministic: every IOC line in the prompt ("Analyze this
+threat IOC: x" or "N. x" in a batch prompt) gets one
+"ioc | verdict | reason" line, streamed a word at a time with
+--token-delay between tokens after --first-token-delay. --fail-rate
+answers that share of requests with HTTP 500.
+
+Usage:
+    python3 ollama_stub.py --port 11434 --token-delay 0.005
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+
+from aiohttp import web
+
+_IOC_LINES = re.compile(r'^(?:Analyze this threat IOC: (\S+)|\d+\. (\S+))', re.MULTILINE)
+_VERDICTS = ('malicious', 'suspicious', 'benign')
+
+
+def stub_answer(prompt):
+    lines = []
+    for single, numbered in _IOC_LINES.findall(prompt):
+        ioc = single or numbered
+        verdict = _VERDICTS[zlib.crc32(ioc.encode()) % len(_VERDICTS)]
+        lines.append(f"{ioc} | {verdict} | stub assessment of {ioc}")
+    return '\n'.join(lines) or "No IOC found in prompt."
+
+
+class OllamaStub:
+    """aiohttp application serving the stub endpoints"""
+
+    def __init__(self, models=('llama2',), token_delay=0.0, first_token_delay=0.0, fail_rate=0.0):
+        self.models = list(models)
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.fail_rate = fail_rate
+        self.stats = {'generate': 0, 'failed': 0, 'active': 0, 'max_active': 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/', self.root)
+        app.router.add_get('/api/tags', self.tags)
+        app.router.add_post('/api/generate', self.generate)
+        return app
+
+    async def root(self, request):
+        return web.Response(text="Ollama is running")
+
+    async def tags(self, request):
+        return web.json_response({'models': [{'name': f"{m}:latest", 'model': f"{m}:latest"} for m in self.models]})
+
+    async def generate(self, request):
+        body = await request.json()
+        self.stats['generate'] += 1
+        if random.random() < self.fail_rate:
+            self.stats['failed'] += 1
+            return web.json_response({'error': 'stub failure'}, status=500)
+
+        model = body.get('model', self.models[0])
+        words = re.findall(r'\S+\s*', stub_answer(body.get('prompt', '')))
+        started = time.perf_counter()
+        self.stats['active'] += 1
+        self.stats['max_active'] = max(self.stats['max_active'], self.stats['active'])
+        try:
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+
+            if not body.get('stream', True):
+                await asyncio.sleep(self.token_delay * len(words))
+                return web.json_response(self._chunk(model, ''.join(words), True, started, len(words)))
+
+            resp = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await resp.prepare(request)
+            try:
+                for word in words:
+                    if self.token_delay:
+                        await asyncio.sleep(self.token_delay)
+                    await resp.write((json.dumps(self._chunk(model, word, False, started)) + '\n').encode())
+                await resp.write((json.dumps(self._chunk(model, '', True, started, len(words))) + '\n').encode())
+                await resp.write_eof()
+            except ConnectionResetError:
+                pass  # client gave up mid-stream
+            return resp
+        finally:
+            self.stats['active'] -= 1
+
+    @staticmethod
+    def _chunk(model, text, done, started, eval_count=None):
+        chunk = {'model': model, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                 'response': text, 'done': done}
+        if done:
+            chunk['total_duration'] = int((time.perf_counter() - started) * 1e9)
+            chunk['eval_count'] = eval_count
+        return chunk
+
+
+async def start_stub(port=11434, host='127.0.0.1', **options):
+    """Run the stub on the current loop; returns (runner, stub) - await runner.cleanup() to stop"""
+    stub = OllamaStub(**options)
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ollama API stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--models', nargs='+', default=['llama2'])
+    parser.add_argument('--token-delay', type=float, default=0.0)
+    parser.add_argument('--first-token-delay', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = OllamaStub(args.models, args.token_delay, args.first_token_delay, args.fail_rate)
+    print(f"🦙 Ollama stub on http://{args.host}:{args.port}")
+    web.run_app(stub.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
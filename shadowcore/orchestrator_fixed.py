@@ -13,6 +13,13 @@ import aiohttp
 import redis
 from neo4j import GraphDatabase
 
+from circuit_breaker import CircuitOpenError, breakers
+from correlation_engine import correlate_ioc
+from enrichment_cache import EnrichmentCache
+from ioc_classifier import ioc_type, normalize_ioc
+from stage_graph import StageGraph
+from vector_index import get_vector_index, threat_text
+
 class ShadowCoreOrchestrator:
     """Your complete vision: Agent Manager + Worker Pool + AI Engines + OSINT + Memory"""
     
@@ -73,35 +80,27 @@ class ShadowCoreOrchestrator:
             print("  ⚠️  Neo4j connection failed")
             self.neo4j_driver = None
         
+        # Pipeline stages and their data dependencies
+        self.pipeline = self._build_pipeline()
+        
+        # Enrichment results cached per source (memory, then shared Redis)
+        self.enrichment = EnrichmentCache(self.redis_client)
+        
         print("✅ Orchestrator initialized")
     
     async def process_threat_ioc(self, ioc):
         """Complete threat processing pipeline"""
+        ioc = normalize_ioc(ioc)
         print(f"\n🚀 Processing IOC: {ioc}")
         print("-" * 40)
         
-        results = {}
-        
-        # STEP 1: AGENT MANAGER - Schedule and ACL
-        print("1. 👔 Agent Manager: Scheduling task...")
-        results["scheduled"] = await self._schedule_task(ioc)
-        
-        # STEP 2: WORKER POOL - Process with workers
-        print("2. 👷 Worker Pool: Processing IOC...")
-        results["processed"] = await self._worker_process(ioc)
-        
-        # STEP 3: AI ENGINES - Cognitive analysis
-        print("3. 🤖 AI Engines: Analyzing patterns...")
-        results["ai_analysis"] = await self._ai_analyze(results["processed"])
-        
-        # STEP 4: OSINT ENGINE - Enrich with external intel
-        print("4. 📡 OSINT Engine: Enriching with feeds...")
-        results["osint_enriched"] = await self._osint_enrich(ioc, results["ai_analysis"])
-        
-        # STEP 5: MEMORY - Store and correlate
-        print("5. 🗄️ Memory: Storing and correlating...")
-        results["stored"] = await self._store_intelligence(ioc, results)
-        results["correlated"] = await self._correlate_intelligence(ioc)
+        # STEPS 1-5: Agent Manager, Worker Pool, AI, OSINT and Memory run as a
+        # stage graph - independent stages overlap instead of queueing
+        print("⚡ Running pipeline stages (concurrent where independent)...")
+        timings = {}
+        results = await self.pipeline.run(ioc, timings=timings)
+        for stage, elapsed in timings.items():
+            print(f"   {stage:15} {elapsed * 1000:7.1f} ms")
         
         # STEP 6: GENERATE REPORT
         print("6. 📊 Generating intelligence report...")
@@ -109,17 +108,54 @@ class ShadowCoreOrchestrator:
         
         return results
     
+    def _build_pipeline(self):
+        """Stage graph: each stage declares the results it needs"""
+        graph = StageGraph()
+        graph.add("scheduled", self._schedule_task)                      # 1. Agent Manager
+        graph.add("processed", self._worker_process)                     # 2. Worker Pool
+        graph.add("ai_analysis", lambda ioc, processed: self._ai_analyze(ioc, processed),
+                  needs=["processed"])                                   # 3. AI Engines
+        graph.add("osint_enriched", lambda ioc: self._osint_enrich(ioc, None))  # 4. OSINT
+        graph.add("correlated", self._correlate_intelligence)            # 5b. Correlate
+        graph.add("stored", lambda ioc, **data: self._store_intelligence(ioc, data),
+                  needs=["scheduled", "processed", "ai_analysis", "osint_enriched"])  # 5a. Store
+        return graph
+    
+    async def _request(self, dependency, method, url, timeout, **kwargs):
+        """POST/GET a dependency behind its circuit breaker
+        
+        Returns the JSON body for a 200 response, otherwise None. Raises
+        CircuitOpenError straight away while the dependency is known-down,
+        and re-raises connection errors after counting them.
+        """
+        breaker = breakers.get(dependency)
+        permit = breaker.allow()
+        if not permit:
+            raise CircuitOpenError(dependency)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.request(method, url, timeout=timeout, **kwargs) as response:
+                    if response.status >= 500:
+                        breaker.record_failure(f"HTTP {response.status}")
+                        return None
+                    data = await response.json() if response.status == 200 else None
+            breaker.record_success()
+            return data
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        finally:
+            breaker.release(permit)
+    
     async def _schedule_task(self, ioc):
         """Agent Manager: Schedule task with ACL"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.agent_manager['rest_api']}/api/tasks",
-                    json={"task": "analyze_ioc", "ioc": ioc, "priority": "high"},
-                    timeout=2
-                ) as response:
-                    if response.status == 200:
-                        return {"status": "scheduled", "task_id": f"task_{int(time.time())}"}
+            await self._request(
+                "rest_api", "POST", f"{self.agent_manager['rest_api']}/api/tasks",
+                timeout=2, json={"task": "analyze_ioc", "ioc": ioc, "priority": "high"}
+            )
+        except CircuitOpenError:
+            pass
         except Exception as e:
             print(f"    ⚠️  Schedule failed: {e}")
         
@@ -131,42 +167,39 @@ class ShadowCoreOrchestrator:
         
         # Try proxy worker first
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.worker_pool['proxy']}/process",
-                    json={"ioc": ioc, "worker": "all"},
-                    timeout=3
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()
+            data = await self._request(
+                "proxy", "POST", f"{self.worker_pool['proxy']}/process",
+                timeout=3, json={"ioc": ioc, "worker": "all"}
+            )
+            if data is not None:
+                return data
         except:
             pass
         
         # Simulate worker processing
-        ioc_type = self._detect_ioc_type(ioc)
-        results["parser"] = {"type": ioc_type, "value": ioc}
+        kind = ioc_type(ioc)
+        results["parser"] = {"type": kind, "value": ioc}
         results["crawler"] = {"related": ["simulated_related_1", "simulated_related_2"]}
         results["extractor"] = {"indicators": ["suspicious", "needs_investigation"]}
         results["classifier"] = {"category": "potential_threat", "confidence": 0.7}
         
         return results
     
-    async def _ai_analyze(self, processed_data):
+    async def _ai_analyze(self, ioc, processed_data):
         """AI Engines: Cognitive analysis + embeddings"""
         analysis = {}
         
         # Shadowbrain cognitive analysis
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ai_engines['shadowbrain']}/api/reason",
-                    json={"query": str(processed_data)},
-                    timeout=3
-                ) as response:
-                    if response.status == 200:
-                        analysis["cognitive"] = await response.json()
+            data = await self.enrichment.get("shadowbrain", ioc, lambda: self._request(
+                "shadowbrain", "POST", f"{self.ai_engines['shadowbrain']}/api/reason",
+                timeout=3, json={"query": str(processed_data)}
+            ))
+            if data is not None:
+                analysis["cognitive"] = data
         except Exception as e:
-            print(f"    ⚠️  Shadowbrain failed: {e}")
+            if not isinstance(e, CircuitOpenError):
+                print(f"    ⚠️  Shadowbrain failed: {e}")
             analysis["cognitive"] = {
                 "threat_level": "medium",
                 "confidence": 0.75,
@@ -174,25 +207,22 @@ class ShadowCoreOrchestrator:
                 "recommendations": ["monitor", "investigate"]
             }
         
-        # Qdrant similarity (simulated)
-        analysis["similar"] = [
-            {"id": "threat_001", "score": 0.85, "info": "Known malicious pattern"},
-            {"id": "threat_002", "score": 0.72, "info": "Suspicious infrastructure"}
-        ]
+        # Similarity search against the local vector index (Qdrant search API)
+        analysis["similar"] = get_vector_index().search_text(
+            threat_text(ioc, {"type": ioc_type(ioc)}), limit=3
+        )
         
         return analysis
     
     async def _osint_enrich(self, ioc, ai_analysis):
         """OSINT Engine: Enrich with external feeds"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.osint_engine['threat_insight']}/api/enrich",
-                    params={"ioc": ioc},
-                    timeout=3
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()
+            data = await self.enrichment.get("threat_insight", ioc, lambda: self._request(
+                "threat_insight", "GET", f"{self.osint_engine['threat_insight']}/api/enrich",
+                timeout=3, params={"ioc": ioc}
+            ))
+            if data is not None:
+                return data
         except:
             pass
         
@@ -206,7 +236,15 @@ class ShadowCoreOrchestrator:
         }
     
     async def _store_intelligence(self, ioc, all_data):
-        """Memory: Store in all memory systems"""
+        """Memory: Store in all memory systems
+        
+        The Redis and Neo4j clients are synchronous, so the writes run in
+        the default executor instead of blocking the other stages.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._store_intelligence_sync, ioc, all_data)
+    
+    def _store_intelligence_sync(self, ioc, all_data):
         stored = {}
         
         # Redis
@@ -230,7 +268,7 @@ class ShadowCoreOrchestrator:
                             t.timestamp = datetime(),
                             t.analyzed = true
                         RETURN t.id
-                    """, ioc=ioc, type=self._detect_ioc_type(ioc))
+                    """, ioc=ioc, type=ioc_type(ioc))
                     stored["neo4j"] = ioc
             except Exception as e:
                 stored["neo4j"] = f"error: {e}"
@@ -243,39 +281,18 @@ class ShadowCoreOrchestrator:
         return stored
     
     async def _correlate_intelligence(self, ioc):
-        """Memory: Correlate with existing intelligence"""
-        correlated = {
-            "related_threats": [],
-            "campaigns": [],
-            "actors": []
-        }
+        """Memory: Correlate with existing intelligence
         
-        if self.neo4j_driver:
-            try:
-                with self.neo4j_driver.session() as session:
-                    result = session.run("""
-                        MATCH (t:Threat)
-                        WHERE t.id <> $ioc
-                        RETURN t.id as related, t.type as type
-                        LIMIT 3
-                    """, ioc=ioc)
-                    
-                    for record in result:
-                        correlated["related_threats"].append({
-                            "id": record["related"],
-                            "type": record["type"]
-                        })
-            except:
-                pass
-        
-        # Add simulated correlations if none found
-        if not correlated["related_threats"]:
-            correlated["related_threats"] = [
-                {"id": "sim_threat_1", "type": "ip"},
-                {"id": "sim_threat_2", "type": "domain"}
-            ]
+        Uses the correlation engine's shared-attribute indexes; campaigns are
+        the malware families seen among the related IOCs.
+        """
+        related = await asyncio.get_running_loop().run_in_executor(None, correlate_ioc, ioc)
         
-        return correlated
+        return {
+            "related_threats": related,
+            "campaigns": sorted({r["malware"] for r in related if r["malware"]}),
+            "actors": []
+        }
     
     def _generate_report(self, ioc, results):
         """Generate intelligence report"""
@@ -290,42 +307,32 @@ class ShadowCoreOrchestrator:
             "report_id": f"report_{int(time.time())}"
         }
     
-    def _detect_ioc_type(self, ioc):
-        """Detect IOC type"""
-        if "." in ioc:
-            parts = ioc.split(".")
-            if len(parts) == 4 and all(p.isdigit() for p in parts):
-                return "ip"
-            return "domain"
-        elif len(ioc) in [32, 40, 64]:
-            return "hash"
-        elif ioc.startswith("http"):
-            return "url"
-        return "unknown"
-    
     async def health_check(self):
         """Check health of all components"""
         print("\n🏥 ORCHESTRATOR HEALTH CHECK:")
         print("-" * 30)
         
         components = {
-            "Agent Manager": list(self.agent_manager.values()),
-            "Worker Pool": list(self.worker_pool.values()),
-            "AI Engines": list(self.ai_engines.values()),
-            "OSINT Engine": list(self.osint_engine.values())
+            "Agent Manager": self.agent_manager,
+            "Worker Pool": self.worker_pool,
+            "AI Engines": self.ai_engines,
+            "OSINT Engine": self.osint_engine
         }
         
         healthy_count = 0
         total_count = 0
         
-        for name, urls in components.items():
+        # Probe results feed the shared circuit breakers, so the pipeline
+        # stops calling anything found down here (and resumes once it's up)
+        for name, services in components.items():
             print(f"\n{name}:")
-            for url in urls:
+            for service, url in services.items():
                 total_count += 1
                 if "://" not in url:
                     print(f"  ❌ {url}: Invalid URL")
                     continue
                 
+                breaker = breakers.get(service)
                 try:
                     async with aiohttp.ClientSession() as session:
                         if url.startswith("ws://"):
@@ -335,10 +342,13 @@ class ShadowCoreOrchestrator:
                                 if response.status < 500:
                                     print(f"  ✅ {url}: HTTP {response.status}")
                                     healthy_count += 1
+                                    breaker.record_success()
                                 else:
                                     print(f"  ⚠️  {url}: HTTP {response.status}")
+                                    breaker.trip(f"HTTP {response.status}")
                 except Exception as e:
                     print(f"  ❌ {url}: {str(e)[:30]}")
+                    breaker.trip(e)
         
         # Check memory systems
         print("\nMemory Systems:")
@@ -371,6 +381,12 @@ class ShadowCoreOrchestrator:
         total_count += 2  # Redis + Neo4j
         
         print(f"\n📊 Health Score: {healthy_count}/{total_count} components healthy")
+        down = breakers.open_names()
+        if down:
+            print(f"⚡ Circuit open (skipped by pipeline): {', '.join(down)}")
+        enrichment = self.enrichment.snapshot()["total"]
+        if enrichment["lookups"]:
+            print(f"🗃️  Enrichment cache: {enrichment['hit_rate']:.0%} hit rate over {enrichment['lookups']} lookups")
         return healthy_count, total_count
 
 async def main():
@@ -5,7 +5,8 @@ Populate your system with real threat intelligence
 
 import json
 from datetime import datetime, timedelta
-import random
+
+from vector_index import build_threat_index
 
 # Real APT groups and campaigns
 REAL_THREAT_INTEL = {
@@ -112,45 +113,45 @@ def populate_neo4j():
     print(f"\n💾 Saved to: /opt/shadowcore/threat_intelligence_graph.json")
 
 def populate_qdrant():
-    """Populate Qdrant with vector embeddings"""
+    """Embed threat intelligence into the local vector index"""
     print("\n🧠 Creating vector embeddings for threat intelligence...")
     
-    # Create embeddings for threat patterns
-    embeddings = []
+    # (id, text to embed, payload) for each threat pattern
+    items = []
     
     for apt in REAL_THREAT_INTEL["apt_groups"]:
-        # Create embedding for APT group
-        embedding = {
-            "id": f"apt_{apt['name'].replace(' ', '_').lower()}",
-            "vector": [random.random() for _ in range(128)],  # Simulated embedding
-            "payload": {
-                "type": "threat_actor",
-                "name": apt["name"],
-                "country": apt["country"],
-                "targets": apt["targets"]
-            }
-        }
-        embeddings.append(embedding)
+        text = " ".join([apt["name"], apt["country"]] + apt["targets"] + apt["ttps"] + apt["campaigns"])
+        items.append((f"apt_{apt['name'].replace(' ', '_').lower()}", text, {
+            "type": "threat_actor",
+            "name": apt["name"],
+            "country": apt["country"],
+            "targets": apt["targets"]
+        }))
     
     for malware in REAL_THREAT_INTEL["malware_families"]:
-        embedding = {
-            "id": f"malware_{malware['name'].replace(' ', '_').lower()}",
-            "vector": [random.random() for _ in range(128)],
-            "payload": {
-                "type": "malware",
-                "name": malware["name"],
-                "family": malware["type"],
-                "ioc_count": len(malware["iocs"])
-            }
-        }
-        embeddings.append(embedding)
+        text = " ".join([malware["name"], malware["type"]] + [ioc["value"] for ioc in malware["iocs"]])
+        items.append((f"malware_{malware['name'].replace(' ', '_').lower()}", text, {
+            "type": "malware",
+            "name": malware["name"],
+            "family": malware["type"],
+            "ioc_count": len(malware["iocs"])
+        }))
+    
+    # Searchable index: these patterns plus every IOC in the threat cache
+    index = build_threat_index(extra=items)
     
-    # Save embeddings
+    # Same points as JSON, ready to POST to a Qdrant collection if wanted
+    embeddings = [{
+        "id": point_id,
+        "vector": [round(float(x), 6) for x in index.matrix[index.rows[point_id]]],
+        "payload": payload
+    } for point_id, _, payload in items]
     with open("/opt/shadowcore/threat_embeddings.json", "w") as f:
         json.dump(embeddings, f, indent=2)
     
     print(f"✅ Created {len(embeddings)} threat embeddings")
-    print(f"💾 Saved to: /opt/shadowcore/threat_embeddings.json")
+    print(f"✅ Vector index holds {len(index.ids)} points ({index.dim} dims)")
+    print(f"💾 Saved to: /opt/shadowcore/threat_embeddings.json and {index.path}.f32")
 
 if __name__ == "__main__":
     print("🎯 POPULATING SHADOWCORE WITH REAL THREAT INTELLIGENCE")
@@ -42,29 +42,27 @@ print(' '.join(random.sample(ips, min(5, len(ips)))))
     ")
     
     echo -e "${YELLOW}Testing with REAL malicious IPs:${NC}"
-    for ip in $MALICIOUS_IPS; do
-        echo -n "  Testing $ip... "
+    # One interpreter + orchestrator for the whole batch (NDJSON reports out).
+    # batch_analyze.py runs CleanShadowCoreOrchestrator, the engine behind the
+    # threat API, not the older FixedShadowCoreOrchestrator.
+    echo "$MALICIOUS_IPS" | tr ' ' '\n' | \
+        python3 /opt/shadowcore/batch_analyze.py - --concurrency 8 --progress 0 2>/dev/null | \
         python3 -c "
-import asyncio
-import sys
-sys.path.insert(0, '/opt/shadowcore')
-try:
-    from fixed_orchestrator import FixedShadowCoreOrchestrator
-    async def test():
-        orchestrator = FixedShadowCoreOrchestrator()
-        return await orchestrator.process_ioc('$ip')
-    result = asyncio.run(test())
+import json, sys
+for line in sys.stdin:
+    result = json.loads(line)
+    print(f\"  Testing {result['ioc']}... \", end='')
+    if 'error' in result:
+        print(f\"\\033[0;31mERROR: {result['error'][:30]}\\033[0m\")
+        continue
     level = result['threat_assessment']['level']
     if level == 'high':
-        print('\033[0;31mHIGH\033[0m')
+        print('\\033[0;31mHIGH\\033[0m')
     elif level == 'medium':
-        print('\033[1;33mMEDIUM\033[0m')
+        print('\\033[1;33mMEDIUM\\033[0m')
     else:
-        print('\033[0;32mLOW\033[0m')
-except Exception as e:
-    print(f'\033[0;31mERROR: {str(e)[:30]}\033[0m')
+        print('\\033[0;32mLOW\\033[0m')
         "
-    done
 fi
 
 # 3. System Status Check
@@ -91,8 +89,8 @@ else
 fi
 
 # Report count
-REPORT_COUNT=$(ls /opt/shadowcore/intelligence_reports/*.json 2>/dev/null | wc -l)
-echo -e "Reports: ${GREEN}$REPORT_COUNT files${NC}"
+REPORT_COUNT=$(python3 /opt/shadowcore/report_store.py stats 2>/dev/null | python3 -c "import json,sys; print(json.load(sys.stdin)['reports'])" 2>/dev/null || echo 0)
+echo -e "Reports: ${GREEN}$REPORT_COUNT stored${NC}"
 
 # 4. Summary
 echo ""
@@ -104,7 +102,7 @@ echo ""
 echo -e "${YELLOW}📈 NEXT STEPS:${NC}"
 echo "1. View dashboard: http://localhost:8020"
 echo "2. Explore Neo4j: http://localhost:7474"
-echo "3. Check reports: ls -la /opt/shadowcore/intelligence_reports/"
+echo "3. Check reports: python3 /opt/shadowcore/report_store.py latest 10"
 echo "4. Add more feeds: Edit /opt/shadowcore/feed_manager.py"
 echo ""
 echo -e "${GREEN}✅ ShadowCore is now detecting REAL threats from OSINT feeds!${NC}"
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+ShadowCore report store - segmented, compressed, append-only
+
+Reports are appended in batches to segment files under
+/opt/shadowcore/intelligence_reports/store/:
+
+  seg-000001.jsonl.gz   concatenated gzip members, one per appended batch
+                        (the file as a whole is readable with zcat)
+  seg-000001.idx        sidecar index, one JSON row per report:
+                        [timestamp, report_id, ioc, offset, length, row]
+
+A segment is closed once it passes segment_bytes and a new one started,
+so writes are always sequential appends. Opening a store only lists the
+segment files, so one-shot callers (latest 10, stats) stay cheap however
+large the store is:
+
+  latest(n)            reads the newest .idx files backwards from the end
+  get(), reports_for_ioc()
+                       look the id / IOC up in per-segment {report_id:
+                       row} and {ioc: [rows]} maps, newest segment first.
+                       A segment's maps are built from its .idx on first
+                       use and kept for the index_segments most recently
+                       used segments (a sealed segment never changes; the
+                       active one is topped up with rows added since)
+  scan(start, end)     skips segments outside the time range (per-segment
+                       time bounds)
+  stats()              counts index rows without parsing them
+
+Reads then decompress only the blocks they return. Retention drops whole
+segments.
+
+Appends take an exclusive flock on the active segment, so the API and
+batch runs can share a store; readers pick up other writers' rows on
+their next query.
+
+Usage:
+    python3 report_store.py stats
+    python3 report_store.py latest 10
+    python3 report_store.py get CLEAN-1718000000-0042
+    python3 report_store.py ioc 23.95.44.80
+    python3 report_store.py retention --max-age-days 30 --max-bytes 10000000000
+"""
+import argparse
+import fcntl
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+STORE_DIR = "/opt/shadowcore/intelligence_reports/store"
+SEGMENT_BYTES = 64 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+TAIL_CHUNK = 64 * 1024
+INDEX_SEGMENTS = 16
+
+
+def report_time(report):
+    """Epoch seconds of a report's ISO timestamp (now if missing/invalid)"""
+    try:
+        return datetime.fromisoformat(report['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def _as_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _parse_row(line, seq):
+    """(ts, report_id, ioc, offset, length, row, seq) from an index line, or None"""
+    try:
+        ts, report_id, ioc, offset, length, row = json.loads(line)
+    except ValueError:
+        return None
+    return ts, report_id, ioc, offset, length, row, seq
+
+
+class Segment:
+    """One data file plus its index file, time bounds and (when loaded) lookup maps"""
+
+    __slots__ = ('seq', 'path', 'index_path', 'min_ts', 'max_ts', 'bounds_pos',
+                 'by_id', 'by_ioc', 'index_pos')
+
+    def __init__(self, root, seq):
+        self.seq = seq
+        self.path = os.path.join(root, f"seg-{seq:06d}.jsonl.gz")
+        self.index_path = os.path.join(root, f"seg-{seq:06d}.idx")
+        self.min_ts = None
+        self.max_ts = None
+        self.bounds_pos = 0  # index bytes the bounds cover
+        self.by_id = None
+        self.by_ioc = None
+        self.index_pos = 0  # index bytes the maps cover
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def rows(self, start=0):
+        """(end offset, entry) for each complete index row from byte start on"""
+        try:
+            f = open(self.index_path, 'rb')
+        except OSError:
+            return
+        with f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # row still being written
+                pos += len(line)
+                entry = _parse_row(line, self.seq)
+                if entry is not None:
+                    yield pos, entry
+
+    def rows_reversed(self):
+        """Complete index rows newest first, reading the file from the end"""
+        try:
+            f = open(self.index_path, 'rb')
+        except OSError:
+            return
+        with f:
+            pos = f.seek(0, os.SEEK_END)
+            pending = None  # None until the last complete row's end is found
+            while pos > 0:
+                size = min(TAIL_CHUNK, pos)
+                pos -= size
+                f.seek(pos)
+                chunk = f.read(size)
+                if pending is None:
+                    cut = chunk.rfind(b'\n')
+                    if cut < 0:
+                        continue  # still inside a row being written
+                    chunk, pending = chunk[:cut], b''
+                lines = (chunk + pending).split(b'\n')
+                pending = lines.pop(0) if pos else b''
+                for line in reversed(lines):
+                    entry = _parse_row(line, self.seq) if line else None
+                    if entry is not None:
+                        yield entry
+
+    def count(self):
+        """Complete index rows, counted without parsing"""
+        count = 0
+        try:
+            with open(self.index_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK), b''):
+                    count += chunk.count(b'\n')
+        except OSError:
+            pass
+        return count
+
+    def load_index(self):
+        """Build (or top up with new rows) the report_id / IOC maps"""
+        if self.by_id is None:
+            self.by_id, self.by_ioc, self.index_pos = {}, {}, 0
+        for pos, entry in self.rows(start=self.index_pos):
+            self.by_id[entry[1]] = entry
+            self.by_ioc.setdefault(entry[2], []).append(entry)
+            self.index_pos = pos
+
+    def unload_index(self):
+        self.by_id = self.by_ioc = None
+        self.index_pos = 0
+
+    def bounds(self):
+        """(min_ts, max_ts), reading only index rows added since last time"""
+        for pos, entry in self.rows(start=self.bounds_pos):
+            ts = entry[0]
+            self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+            self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+            self.bounds_pos = pos
+        return self.min_ts, self.max_ts
+
+
+class ReportStore:
+    """Append-only report segments, queried through their index files"""
+
+    def __init__(self, root=STORE_DIR, segment_bytes=SEGMENT_BYTES, compress_level=6,
+                 index_segments=INDEX_SEGMENTS):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.compress_level = compress_level
+        self.index_segments = index_segments
+        self.segments = {}
+        self._indexed = OrderedDict()  # seq -> segment with loaded maps, LRU
+        self._lock = threading.Lock()
+        self._block_cache = (None, None)
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    # ----- segments ------------------------------------------------------
+
+    def refresh(self):
+        """Pick up segments created (or removed) by any process"""
+        with self._lock:
+            found = set()
+            for index_path in glob.glob(os.path.join(self.root, 'seg-*.idx')):
+                seq = int(os.path.basename(index_path)[4:10])
+                found.add(seq)
+                if seq not in self.segments:
+                    self.segments[seq] = Segment(self.root, seq)
+            for seq in set(self.segments) - found:
+                del self.segments[seq]
+                self._indexed.pop(seq, None)
+
+    def _newest_first(self):
+        return [self.segments[seq] for seq in sorted(self.segments, reverse=True)]
+
+    def _indexed_segment(self, segment):
+        """segment with its lookup maps loaded and current (LRU-cached)"""
+        with self._lock:
+            segment.load_index()
+            self._indexed[segment.seq] = segment
+            self._indexed.move_to_end(segment.seq)
+            while len(self._indexed) > self.index_segments:
+                _, evicted = self._indexed.popitem(last=False)
+                evicted.unload_index()
+        return segment
+
+    # ----- writes --------------------------------------------------------
+
+    def append(self, reports, fsync=False):
+        """Append a batch of reports as one compressed block; returns count"""
+        reports = list(reports)
+        if not reports:
+            return 0
+        lines = [json.dumps(r, default=str) for r in reports]
+        block = gzip.compress(('\n'.join(lines) + '\n').encode(), self.compress_level)
+
+        self.refresh()
+        with self._lock:
+            segment = self._active_segment()
+            with open(segment.path, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(f.fileno()).st_size >= self.segment_bytes:
+                        # Another process filled it since our refresh - roll over
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                        f.close()
+                        segment = self._new_segment()
+                        f = open(segment.path, 'ab')
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    offset = os.fstat(f.fileno()).st_size
+                    f.write(block)
+                    f.flush()
+                    if fsync:
+                        os.fsync(f.fileno())
+                    rows = []
+                    for row, report in enumerate(reports):
+                        rows.append((report_time(report), str(report.get('report_id', '')),
+                                     str(report.get('ioc', '')), offset, len(block), row))
+                    with open(segment.index_path, 'a') as idx:
+                        idx.write(''.join(json.dumps(r) + '\n' for r in rows))
+                finally:
+                    f.close()
+        return len(reports)
+
+    def _active_segment(self):
+        if not self.segments:
+            return self._new_segment()
+        segment = self.segments[max(self.segments)]
+        if segment.size() >= self.segment_bytes:
+            return self._new_segment()
+        return segment
+
+    def _new_segment(self):
+        seq = max(self.segments, default=0) + 1
+        while True:
+            segment = Segment(self.root, seq)
+            try:
+                # O_EXCL claims the sequence number against other writers
+                os.close(os.open(segment.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                seq += 1
+        open(segment.index_path, 'a').close()
+        self.segments[seq] = segment
+        return segment
+
+    # ----- reads ---------------------------------------------------------
+
+    def _read(self, entry):
+        ts, report_id, ioc, offset, length, row, seq = entry
+        key = (seq, offset)
+        cached_key, lines = self._block_cache
+        if cached_key != key:
+            with open(self.segments[seq].path, 'rb') as f:
+                f.seek(offset)
+                lines = gzip.decompress(f.read(length)).splitlines()
+            self._block_cache = (key, lines)
+        return json.loads(lines[row])
+
+    def get(self, report_id):
+        """Report by report_id, or None (newest wins if appended twice)"""
+        self.refresh()
+        for segment in self._newest_first():
+            entry = self._indexed_segment(segment).by_id.get(report_id)
+            if entry is not None:
+                return self._read(entry)
+        return None
+
+    def reports_for_ioc(self, ioc, limit=None):
+        """Reports for one IOC, newest first"""
+        self.refresh()
+        entries = []
+        for segment in self._newest_first():
+            if limit is not None and len(entries) >= limit:
+                break
+            entries.extend(reversed(self._indexed_segment(segment).by_ioc.get(ioc, ())))
+        return [self._read(e) for e in entries[:limit]]
+
+    def latest(self, n=10):
+        """The n most recently appended reports, newest first"""
+        self.refresh()
+        out = []
+        if n <= 0:
+            return out
+        for segment in self._newest_first():
+            for entry in segment.rows_reversed():
+                out.append(self._read(entry))
+                if len(out) >= n:
+                    return out
+        return out
+
+    def scan(self, start=None, end=None):
+        """Yield reports with start <= timestamp < end in append order
+
+        start/end may be epoch seconds, datetimes or ISO strings.
+        """
+        self.refresh()
+        start, end = _as_epoch(start), _as_epoch(end)
+        for seq in sorted(self.segments):
+            segment = self.segments[seq]
+            min_ts, max_ts = segment.bounds()
+            if min_ts is None:
+                continue
+            if (start is not None and max_ts < start) or (end is not None and min_ts >= end):
+                continue
+            for _, entry in segment.rows():
+                ts = entry[0]
+                if (start is None or ts >= start) and (end is None or ts < end):
+                    yield self._read(entry)
+
+    # ----- maintenance ---------------------------------------------------
+
+    def apply_retention(self, max_age_days=None, max_bytes=None):
+        """Delete the oldest closed segments past the age or size budget
+
+        The active (newest) segment is never removed. Returns the number of
+        segments deleted.
+        """
+        self.refresh()
+        removed = 0
+        with self._lock:
+            ordered = sorted(self.segments)[:-1]
+            cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+            total = sum(s.size() for s in self.segments.values())
+            for seq in ordered:
+                segment = self.segments[seq]
+                max_ts = segment.bounds()[1] if cutoff is not None else None
+                too_old = max_ts is not None and max_ts < cutoff
+                too_big = max_bytes is not None and total > max_bytes
+                if not (too_old or too_big):
+                    break
+                total -= segment.size()
+                self._drop(segment)
+                removed += 1
+        return removed
+
+    def _drop(self, segment):
+        for path in (segment.path, segment.index_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        del self.segments[segment.seq]
+        self._indexed.pop(segment.seq, None)
+        self._block_cache = (None, None)
+
+    def stats(self):
+        """Counts from the index files; oldest/newest are the first and last rows appended"""
+        self.refresh()
+        segments = [self.segments[seq] for seq in sorted(self.segments)]
+        oldest = next((entry[0] for s in segments for _, entry in s.rows()), None)
+        newest = next((entry[0] for s in reversed(segments) for entry in s.rows_reversed()), None)
+        return {
+            'reports': sum(s.count() for s in segments),
+            'segments': len(segments),
+            'bytes': sum(s.size() for s in segments),
+            'oldest': oldest,
+            'newest': newest,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ShadowCore report store')
+    parser.add_argument('--root', default=STORE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats')
+    latest = sub.add_parser('latest')
+    latest.add_argument('n', type=int, nargs='?', default=10)
+    get = sub.add_parser('get')
+    get.add_argument('report_id')
+    ioc = sub.add_parser('ioc')
+    ioc.add_argument('ioc')
+    retention = sub.add_parser('retention')
+    retention.add_argument('--max-age-days', type=float)
+    retention.add_argument('--max-bytes', type=int)
+    args = parser.parse_args()
+
+    store = ReportStore(args.root)
+    if args.command == 'stats':
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == 'latest':
+        for report in store.latest(args.n):
+            print(json.dumps(report))
+    elif args.command == 'get':
+        report = store.get(args.report_id)
+        print(json.dumps(report, indent=2) if report else f"Not found: {args.report_id}")
+    elif args.command == 'ioc':
+        for report in store.reports_for_ioc(args.ioc):
+            print(json.dumps(report))
+    elif args.command == 'retention':
+        removed = store.apply_retention(args.max_age_days, args.max_bytes)
+        print(f"Removed {removed} segment(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+ShadowCore sharded orchestrator - one clean orchestrator per core
+
+    sharded = ShardedOrchestrator(shards=4)
+    await sharded.start()
+    report = await sharded.process_ioc("23.95.44.80")
+    async for report in sharded.process_iocs(lines):
+        ...
+    await sharded.close()
+
+N worker processes each run their own event loop and
+CleanShadowCoreOrchestrator, so heuristics, report building and
+serialization run on N cores instead of contending for one GIL.
+
+Routing: IOCs are normalized and placed on a consistent-hash ring
+(64 virtual nodes per shard), so an IOC always lands on the same shard.
+Its single-flight table, graph micro-batches and warm connections stay
+there, and changing the shard count only moves about 1/N of the IOCs.
+
+Dead shards: when a worker exits (crash, OOM kill) its in-flight requests
+fail with RuntimeError, the shard is marked dead and taken off the ring,
+so its IOCs reroute to the surviving shards (about 1/N of the keys move;
+everything else keeps its shard). With no shard left, requests fail
+immediately.
+
+Shared memory: the parent loads the threat cache and allowlist once,
+freezes them out of the garbage collector (gc.freeze) and forks the
+workers. The columnar threat-cache arrays are then shared copy-on-write
+pages, not N private copies.
+
+Usage:
+    python3 sharded_orchestrator.py --shards 4 iocs.txt
+    cat iocs.txt | python3 sharded_orchestrator.py --ndjson > reports.ndjson
+"""
+import argparse
+import asyncio
+import bisect
+import gc
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from clean_orchestrator_fixed import DEFAULT_PROFILE, PROFILES, CleanShadowCoreOrchestrator, aiter_iocs
+from ioc_classifier import normalize_ioc
+
+VNODES = 64
+SHARD_CONCURRENCY = 16
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to shard numbers"""
+
+    def __init__(self, shards, vnodes=VNODES):
+        """shards: a shard count, or the shard numbers to place on the ring"""
+        if isinstance(shards, int):
+            shards = range(shards)
+        points = sorted((_hash(f"shard-{shard}#{v}"), shard) for shard in shards for v in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def __bool__(self):
+        return bool(self._shards)
+
+    def shard_for(self, key):
+        i = bisect.bisect(self._hashes, _hash(key))
+        return self._shards[i % len(self._shards)]
+
+
+# ----- worker process ------------------------------------------------------
+
+def _shard_main(shard, requests, results, concurrency, quiet, factory, preloaded):
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    asyncio.run(_serve(shard, requests, results, concurrency, factory, preloaded))
+
+
+async def _serve(shard, requests, results, concurrency, factory, preloaded):
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    def read_requests():
+        # Blocking pipe reads stay off the event loop
+        while True:
+            try:
+                message = requests.recv()
+            except EOFError:
+                message = None
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message is None:
+                return
+
+    threading.Thread(target=read_requests, daemon=True).start()
+    orchestrator = factory(**preloaded)
+    if hasattr(orchestrator, 'prewarm'):
+        await orchestrator.prewarm()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def handle(req_id, ioc, force_refresh, budget_ms, profile):
+        async with slots:
+            try:
+                report = await orchestrator.process_ioc(ioc, force_refresh=force_refresh, budget_ms=budget_ms,
+                                                        profile=profile)
+            except Exception as e:
+                report = {'ioc': ioc, 'error': str(e)[:200]}
+        results.send((req_id, report))
+
+    while True:
+        message = await inbox.get()
+        if message is None:
+            break
+        task = asyncio.ensure_future(handle(*message))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.wait(running)
+    if hasattr(orchestrator, 'close'):
+        await orchestrator.close()
+    results.send(None)
+
+
+# ----- parent --------------------------------------------------------------
+
+class ShardedOrchestrator:
+    """Routes IOCs by consistent hash to orchestrator worker processes"""
+
+    def __init__(self, shards=None, concurrency=SHARD_CONCURRENCY, vnodes=VNODES,
+                 quiet=True, factory=CleanShadowCoreOrchestrator):
+        self.shards = shards or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.quiet = quiet
+        self.factory = factory
+        self.vnodes = vnodes
+        self.ring = HashRing(self.shards, vnodes)
+        self.dead = set()
+        self.processes = []
+        self.stats = [{'sent': 0, 'completed': 0} for _ in range(self.shards)]
+        self._senders = []
+        self._pending = {}
+        self._ids = itertools.count()
+        self._loop = None
+
+    def _preload(self):
+        """Threat cache and allowlist, loaded once in the parent to share"""
+        if self.factory is not CleanShadowCoreOrchestrator:
+            return {}
+        template = CleanShadowCoreOrchestrator()
+        return {'threat_cache': template.threat_cache, 'allowlist': template.allowlist}
+
+    async def start(self):
+        """Load shared data, fork the workers and start collecting results"""
+        self._loop = asyncio.get_running_loop()
+        preloaded = self._preload()
+        ctx = multiprocessing.get_context('fork')
+
+        # Objects that survive to the fork are never touched by the cyclic GC
+        # in the children, so their pages stay shared
+        gc.collect()
+        gc.freeze()
+        receivers = []
+        try:
+            for shard in range(self.shards):
+                req_recv, req_send = ctx.Pipe(duplex=False)
+                res_recv, res_send = ctx.Pipe(duplex=False)
+                process = ctx.Process(
+                    target=_shard_main, name=f"shadowcore-shard-{shard}", daemon=True,
+                    args=(shard, req_recv, res_send, self.concurrency, self.quiet, self.factory, preloaded)
+                )
+                process.start()
+                req_recv.close()
+                res_send.close()
+                self.processes.append(process)
+                self._senders.append(req_send)
+                receivers.append(res_recv)
+        finally:
+            gc.unfreeze()
+
+        # Collector threads start only after every fork, so no child is forked
+        # while another thread is running in this process
+        for shard, res_recv in enumerate(receivers):
+            threading.Thread(target=self._collect, args=(shard, res_recv), daemon=True).start()
+
+    def _collect(self, shard, results):
+        """Reader thread: hand each worker result to the loop"""
+        while True:
+            try:
+                message = results.recv()
+            except EOFError:
+                message = None
+            if message is None:
+                self._loop.call_soon_threadsafe(self._shard_gone, shard)
+                return
+            self._loop.call_soon_threadsafe(self._resolve, shard, *message)
+
+    def _resolve(self, shard, req_id, report):
+        self.stats[shard]['completed'] += 1
+        entry = self._pending.pop(req_id, None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_result(report)
+
+    def _shard_gone(self, shard):
+        """Worker exited: take it off the ring and fail what it still owed"""
+        if shard not in self.dead:
+            self.dead.add(shard)
+            self.ring = HashRing([s for s in range(self.shards) if s not in self.dead], self.vnodes)
+        for req_id, (owner, future) in list(self._pending.items()):
+            if owner == shard:
+                del self._pending[req_id]
+                if not future.done():
+                    future.set_exception(RuntimeError(f"shard {shard} exited"))
+
+    async def process_ioc(self, ioc, force_refresh=False, budget_ms=None, profile=DEFAULT_PROFILE):
+        """Analyze one IOC on the shard that owns it"""
+        ioc = normalize_ioc(ioc)
+        req_id = next(self._ids)
+        future = self._loop.create_future()
+        while True:
+            if not self.ring:
+                raise RuntimeError("no live shards")
+            shard = self.ring.shard_for(ioc)
+            try:
+                self._senders[shard].send((req_id, ioc, force_refresh, budget_ms, profile))
+            except (BrokenPipeError, OSError):
+                # Died before its reader thread noticed: reroute
+                self._shard_gone(shard)
+                continue
+            break
+        self._pending[req_id] = (shard, future)
+        self.stats[shard]['sent'] += 1
+        try:
+            return await future
+        finally:
+            # Cancelled callers must not leave their entry behind
+            self._pending.pop(req_id, None)
+
+    async def _process_ioc_safe(self, ioc, force_refresh=False, profile=DEFAULT_PROFILE):
+        try:
+            return await self.process_ioc(ioc, force_refresh=force_refresh, profile=profile)
+        except Exception as e:
+            return {'ioc': ioc, 'error': str(e)[:200]}
+
+    async def process_iocs(self, iocs, concurrency=None, force_refresh=False, profile=DEFAULT_PROFILE):
+        """Stream IOCs through all shards, yielding reports as they finish
+
+        Keeps `concurrency` (default shards x per-shard concurrency) IOCs in
+        flight, so memory stays bounded however long the input is.
+        """
+        concurrency = concurrency or self.shards * self.concurrency
+        source = aiter_iocs(iocs)
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    ioc = await source.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(self._process_ioc_safe(ioc, force_refresh, profile)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    def snapshot(self):
+        return {
+            'shards': self.shards,
+            'in_flight': len(self._pending),
+            'dead': sorted(self.dead),
+            'per_shard': [
+                dict(stats, shard=shard, alive=process.is_alive())
+                for shard, (stats, process) in enumerate(zip(self.stats, self.processes))
+            ],
+        }
+
+    async def close(self):
+        """Let every shard finish its work and flush, then reap the processes"""
+        for sender in self._senders:
+            try:
+                sender.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                process.terminate()
+        for sender in self._senders:
+            sender.close()
+
+
+async def run_cli(args):
+    sharded = ShardedOrchestrator(args.shards, args.concurrency, quiet=not args.verbose)
+    await sharded.start()
+    source = open(args.file) if args.file else sys.stdin
+    started = time.perf_counter()
+    count = errors = 0
+    try:
+        async for report in sharded.process_iocs(source, profile=args.profile):
+            count += 1
+            errors += 'error' in report
+            if args.ndjson:
+                print(json.dumps(report, default=str), flush=True)
+    finally:
+        elapsed = time.perf_counter() - started
+        await sharded.close()
+    summary = {
+        'iocs': count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'iocs_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+        'per_shard': [s['completed'] for s in sharded.stats],
+    }
+    print(json.dumps(summary), file=sys.stderr if args.ndjson else sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded ShadowCore orchestrator')
+    parser.add_argument('file', nargs='?', help='IOC file (default: stdin)')
+    parser.add_argument('--shards', type=int, default=os.cpu_count())
+    parser.add_argument('--concurrency', type=int, default=SHARD_CONCURRENCY, help='in-flight IOCs per shard')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE)
+    parser.add_argument('--ndjson', action='store_true', help='print every report as a JSON line')
+    parser.add_argument('--verbose', action='store_true', help='keep worker output')
+    asyncio.run(run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
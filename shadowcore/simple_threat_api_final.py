@@ -2,63 +2,153 @@
 """
 Simple Threat API for ShadowCore - FINAL FIXED VERSION
 Provides REST API for threat analysis
+
+ASGI app (FastAPI on uvicorn): every handler runs on the one server event
+loop, and the orchestrator is created and prewarmed once at startup, so
+its Redis/Neo4j connection pools, single-flight table and graph
+micro-batches are shared by all in-flight requests. Shutdown flushes the
+write-behind queue and closes the pools.
+
+POST /bulk_analyze/stream scores a request body of any length: NDJSON
+({"ioc": ...} objects or JSON strings) or plain text, one IOC per line,
+read as it arrives. At most `concurrency` IOCs are analyzed at once and
+each result is written back as an NDJSON line as soon as it is ready,
+followed by one {"summary": ...} line, so server memory does not grow
+with the input:
+
+    curl -sN -T iocs.txt 'http://localhost:8003/bulk_analyze/stream?profile=lookup'
+
+Usage:
+    python3 simple_threat_api_final.py
+    uvicorn simple_threat_api_final:app --host 0.0.0.0 --port 8003
 """
-from flask import Flask, request, jsonify
+import asyncio
 import json
 import sys
-import os
+import time
+from contextlib import asynccontextmanager
 
-sys.path.insert(0, '/opt/shadowcore')
-from clean_orchestrator_fixed import CleanShadowCoreOrchestrator
-import asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-app = Flask(__name__)
+sys.path.insert(0, '/opt/shadowcore')
+from clean_orchestrator_fixed import DEFAULT_PROFILE, PROFILES, CleanShadowCoreOrchestrator
+from circuit_breaker import breakers
+from tracing import tracer
 
-# Global orchestrator instance
+# Created at startup (lifespan), shared by every request
 orchestrator = None
 
-def init_orchestrator():
-    """Initialize the orchestrator"""
+# Streaming bulk analysis: analyses in flight per request, and the longest
+# line accepted while waiting for its newline
+BULK_CONCURRENCY = 32
+MAX_BULK_CONCURRENCY = 256
+MAX_LINE_BYTES = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Create and prewarm the orchestrator on the server loop; flush on shutdown"""
     global orchestrator
-    if orchestrator is None:
-        print("🔧 Initializing orchestrator for API...")
-        orchestrator = CleanShadowCoreOrchestrator()
-        print("✅ Orchestrator ready for API requests")
+    print("🔧 Initializing orchestrator for API...")
+    orchestrator = CleanShadowCoreOrchestrator()
+    # Load feeds and open connections now rather than on the first request
+    await orchestrator.prewarm()
+    print("✅ Orchestrator ready for API requests")
+    try:
+        yield
+    finally:
+        await orchestrator.close()
+
+
+app = FastAPI(title="ShadowCore Threat API", version="2.1.0", lifespan=lifespan)
 
-@app.route('/health', methods=['GET'])
-def health():
+
+def error(message, status=400, **extra):
+    return JSONResponse(dict({'error': message}, **extra), status_code=status)
+
+
+def valid_profile(profile):
+    """True for a profile name (any non-string, e.g. a JSON list, is rejected)"""
+    return isinstance(profile, str) and profile in PROFILES
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator may still be reading the request
+
+    Below ASGI spec 2.4 StreamingResponse listens for the disconnect on
+    receive() while streaming, which would swallow request body chunks.
+    Here only the body iterator calls receive() (through request.stream(),
+    which raises ClientDisconnect when the client goes away).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.get('/health')
+async def health():
     """Health check endpoint"""
-    return jsonify({
+    return {
         'status': 'healthy',
         'service': 'ShadowCore Threat API',
-        'version': '2.0.1',
-        'threat_cache': '49,088 threats',
+        'version': '2.1.0',
+        'threat_cache': f"{len(orchestrator.threat_cache):,} threats" if orchestrator else None,
         'endpoints': {
             '/health': 'Health check',
-            '/analyze?ioc=<value>': 'Analyze single IOC',
-            '/bulk_analyze': 'Analyze multiple IOCs (POST JSON)'
+            '/analyze?ioc=<value>[&profile=lookup|standard|deep][&force_refresh=1][&budget_ms=50]': 'Analyze single IOC (optionally within a latency budget)',
+            '/bulk_analyze': 'Analyze multiple IOCs (POST JSON, optional "profile")',
+            '/bulk_analyze/stream[?profile=...][&concurrency=32]': 'Analyze any number of IOCs (POST NDJSON or text lines, streams NDJSON back)',
+            '/metrics': 'Stage/dependency latency histograms (Prometheus)',
+            '/latency': 'Stage/dependency latency percentiles (JSON)'
+        },
+        'analysis_cache': orchestrator.cache_stats() if orchestrator else None,
+        'persistence': orchestrator.writer.snapshot() if orchestrator else None,
+        'graph_lookup_batching': orchestrator.graph_lookup.snapshot() if orchestrator else None,
+        'request_coalescing': orchestrator.flights.snapshot() if orchestrator else None,
+        'dependencies': {
+            'open': breakers.open_names(),
+            'breakers': breakers.snapshot()
         }
-    })
+    }
+
+
+@app.get('/metrics')
+async def metrics():
+    """Per-stage / per-dependency latency histograms (Prometheus format)"""
+    return PlainTextResponse(tracer.render_prometheus(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/latency')
+async def latency():
+    """Latency percentiles per stage and dependency"""
+    return tracer.summary()
 
-@app.route('/analyze', methods=['GET'])
-def analyze():
+
+@app.get('/analyze')
+async def analyze(request: Request):
     """Analyze an IOC"""
-    ioc = request.args.get('ioc', '')
+    args = request.query_params
+    ioc = args.get('ioc', '')
     if not ioc:
-        return jsonify({'error': 'No IOC provided'}), 400
+        return error('No IOC provided')
+    budget_ms = args.get('budget_ms')
+    if budget_ms is not None:
+        try:
+            budget_ms = max(0.0, float(budget_ms))
+        except ValueError:
+            return error('budget_ms must be a number', ioc=ioc)
+    profile = args.get('profile', DEFAULT_PROFILE)
+    if not valid_profile(profile):
+        return error(f"profile must be one of {', '.join(PROFILES)}", ioc=ioc)
 
     print(f"🔍 API Request: Analyzing {ioc}")
 
     try:
-        # Initialize if needed
-        if orchestrator is None:
-            init_orchestrator()
-
-        # Run async analysis
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(orchestrator.process_ioc(ioc))
-        loop.close()
+        force_refresh = args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
+        result = await orchestrator.process_ioc(ioc, force_refresh=force_refresh, budget_ms=budget_ms,
+                                                profile=profile)
 
         # Format response - FIXED: use correct metadata field
         response = {
@@ -67,8 +157,12 @@ def analyze():
             'confidence': result['threat_assessment']['confidence'],
             'malware': result.get('malware', 'unknown'),
             'source': result.get('source', 'unknown'),
+            'cache_hit': result.get('cache_hit', False),
+            'partial': result.get('partial', False),
+            'profile': result.get('profile', profile),
+            'stages_completed': result.get('stages', {}).get('completed'),
         }
-        
+
         # Add metadata if available (it might be '_metadata' or 'metadata')
         if '_metadata' in result:
             response['analysis_time'] = result['_metadata'].get('analysis_time', 0)
@@ -77,51 +171,137 @@ def analyze():
             response['analysis_time'] = result['metadata'].get('analysis_time', 0)
             response['report_id'] = result['metadata'].get('report_id', '')
 
-        return jsonify(response)
+        return response
 
     except Exception as e:
-        return jsonify({'error': str(e), 'ioc': ioc}), 500
+        return error(str(e), 500, ioc=ioc)
+
 
-@app.route('/bulk_analyze', methods=['POST'])
-def bulk_analyze():
+@app.post('/bulk_analyze')
+async def bulk_analyze(request: Request):
     """Analyze multiple IOCs"""
     try:
-        data = request.get_json()
+        data = await request.json()
+        if not isinstance(data, dict):
+            return error('Expected a JSON object')
         iocs = data.get('iocs', [])
 
         if not iocs:
-            return jsonify({'error': 'No IOCs provided'}), 400
-
-        # Initialize if needed
-        if orchestrator is None:
-            init_orchestrator()
+            return error('No IOCs provided')
+        profile = data.get('profile', DEFAULT_PROFILE)
+        if not valid_profile(profile):
+            return error(f"profile must be one of {', '.join(PROFILES)}")
 
+        iocs = iocs[:10]  # Limit to 10 for performance (any size: /bulk_analyze/stream)
+        outcomes = await asyncio.gather(
+            *(orchestrator.process_ioc(ioc, profile=profile) for ioc in iocs),
+            return_exceptions=True
+        )
         results = []
-        for ioc in iocs[:10]:  # Limit to 10 for performance
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(orchestrator.process_ioc(ioc))
-                loop.close()
-
+        for ioc, result in zip(iocs, outcomes):
+            if isinstance(result, Exception):
                 results.append({
                     'ioc': ioc,
-                    'threat_level': result['threat_assessment']['level'],
-                    'confidence': result['threat_assessment']['confidence']
+                    'error': str(result)[:100]
                 })
-            except Exception as e:
+            else:
                 results.append({
                     'ioc': ioc,
-                    'error': str(e)[:100]
+                    'threat_level': result['threat_assessment']['level'],
+                    'confidence': result['threat_assessment']['confidence']
                 })
 
-        return jsonify({
+        return {
             'count': len(results),
             'results': results
-        })
+        }
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error(str(e), 500)
+
+
+async def body_lines(request, stats):
+    """Lines of a (chunked) request body, decoded as they arrive"""
+    buffer = b''
+    skipping = False  # inside an over-long line, dropping it up to its newline
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > MAX_LINE_BYTES:
+                stats['invalid_lines'] += 1
+            else:
+                yield line.decode('utf-8', 'replace')
+        if len(buffer) > MAX_LINE_BYTES:
+            stats['invalid_lines'] += not skipping
+            skipping = True
+            buffer = b''
+    if buffer and not skipping:
+        yield buffer.decode('utf-8', 'replace')
+
+
+async def stream_iocs(request, stats):
+    """IOCs from NDJSON ({"ioc": ...} or "...") or plain-text lines"""
+    async for line in body_lines(request, stats):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line[0] in '{"':
+            try:
+                item = json.loads(line)
+                ioc = (item.get('ioc') or item.get('value')) if isinstance(item, dict) else item
+            except ValueError:
+                ioc = None
+            if not isinstance(ioc, str) or not ioc.strip():
+                stats['invalid_lines'] += 1
+                continue
+            line = ioc
+        stats['received'] += 1
+        yield line
+
+
+def bulk_result(report, profile):
+    """One NDJSON result line for a process_iocs report"""
+    if 'error' in report:
+        return {'ioc': report.get('ioc'), 'error': report['error'][:100]}
+    return {
+        'ioc': report['ioc'],
+        'threat_level': report['threat_assessment']['level'],
+        'confidence': report['threat_assessment']['confidence'],
+        'profile': report.get('profile', profile),
+        'partial': report.get('partial', False),
+    }
+
+
+@app.post('/bulk_analyze/stream')
+async def bulk_analyze_stream(request: Request):
+    """Analyze an NDJSON / text stream of IOCs, streaming NDJSON results back"""
+    args = request.query_params
+    profile = args.get('profile', DEFAULT_PROFILE)
+    if not valid_profile(profile):
+        return error(f"profile must be one of {', '.join(PROFILES)}")
+    try:
+        concurrency = min(MAX_BULK_CONCURRENCY, max(1, int(args.get('concurrency', BULK_CONCURRENCY))))
+    except ValueError:
+        return error('concurrency must be an integer')
+    force_refresh = args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
+
+    async def results():
+        stats = {'received': 0, 'analyzed': 0, 'errors': 0, 'invalid_lines': 0}
+        started = time.perf_counter()
+        async for report in orchestrator.process_iocs(stream_iocs(request, stats), concurrency=concurrency,
+                                                      force_refresh=force_refresh, profile=profile):
+            result = bulk_result(report, profile)
+            stats['analyzed'] += 1
+            stats['errors'] += 'error' in result
+            yield json.dumps(result) + '\n'
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        yield json.dumps({'summary': stats}) + '\n'
+
+    return DuplexStreamingResponse(results(), media_type='application/x-ndjson')
+
 
 if __name__ == '__main__':
     print("🚀 Starting ShadowCore Threat API (FINAL FIXED VERSION)...")
@@ -129,7 +309,9 @@ if __name__ == '__main__':
     print("  GET /health - Health check")
     print("  GET /analyze?ioc=<value> - Analyze single IOC")
     print("  POST /bulk_analyze - Analyze multiple IOCs (JSON)")
-    print("\n🔧 Initializing orchestrator...")
-    init_orchestrator()
-    print("✅ Ready on port 8003")
-    app.run(host='0.0.0.0', port=8003, debug=False, threaded=True)
+    print("  POST /bulk_analyze/stream - Analyze an NDJSON/text stream of IOCs")
+    print("  GET /metrics - Prometheus latency histograms")
+    print("\n🔧 Starting uvicorn on port 8003...")
+    # One worker process, one event loop: the orchestrator's pools and
+    # caches live on it (scale out with sharded_orchestrator, not workers)
+    uvicorn.run(app, host='0.0.0.0', port=8003, workers=1, access_log=False)
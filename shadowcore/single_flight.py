@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of concurrent identical calls
+
+    flights = SingleFlight()
+    report = await flights.do(("8.8.8.8", False), lambda: analyze("8.8.8.8"))
+
+The first caller for a key starts the work; callers arriving while it is
+in flight await the same future and receive the same result (or
+exception). Nothing is cached once the call finishes. A waiter being
+cancelled does not cancel the shared work for the others.
+"""
+import asyncio
+
+
+class SingleFlight:
+    """In-flight call table keyed by request identity"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.stats = {'calls': 0, 'executed': 0, 'coalesced': 0, 'max_waiters': 0}
+        self._waiters = {}
+
+    async def do(self, key, fn):
+        """Await fn() once per key across concurrent callers"""
+        self.stats['calls'] += 1
+        task = self.in_flight.get(key)
+        if task is None:
+            self.stats['executed'] += 1
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+        else:
+            self.stats['coalesced'] += 1
+            self._waiters[key] += 1
+            self.stats['max_waiters'] = max(self.stats['max_waiters'], self._waiters[key])
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self.in_flight.pop(key, None)
+        self._waiters.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved even if every waiter was cancelled
+
+    def snapshot(self):
+        stats = dict(self.stats, in_flight=len(self.in_flight))
+        stats['coalesced_ratio'] = round(stats['coalesced'] / stats['calls'], 3) if stats['calls'] else 0.0
+        return stats
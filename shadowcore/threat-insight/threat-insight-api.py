@@ -4,7 +4,7 @@ THREATINSIGHT API SERVER
 REST API for threat intelligence queries
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import json
 import sys
@@ -16,6 +16,39 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Offline ASN/geolocation range index (built by /opt/shadowcore/geo_index.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from geo_index import get_geo_index
+    geo_index = get_geo_index()
+except ImportError:
+    geo_index = None
+try:
+    from ioc_classifier import classify
+except ImportError:
+    classify = None
+
+# /api/batch/stream analyzes (and geo-looks-up) this many entities at a time,
+# and skips input lines longer than MAX_LINE_BYTES
+STREAM_CHUNK = 256
+MAX_LINE_BYTES = 64 * 1024
+
+def apply_geo_enrichment(result, record):
+    """Fill geolocation/network fields from the local range index"""
+    if not record or not record.get('asn'):
+        return result
+    geolocation = result.setdefault('geolocation', {})
+    network = result.setdefault('network', {})
+    if geolocation.get('country', 'Unknown') == 'Unknown':
+        geolocation['country'] = record['country']
+    if network.get('isp', 'Unknown') == 'Unknown':
+        network['isp'] = record['org']
+    network['asn'] = record['asn']
+    if CORE_AVAILABLE:
+        vpn_asns = insight.threat_data.get('vpn_providers', {}).get('asns', [])
+        network['is_vpn'] = record['asn'] in vpn_asns or f"AS{record['asn']}" in vpn_asns
+    return result
+
 # Import ThreatInsight
 try:
     from threat_insight import ThreatInsight
@@ -37,6 +70,8 @@ def index():
             '/api/analyze/ip/<ip>': 'GET - Analyze IP address',
             '/api/analyze/domain/<domain>': 'GET - Analyze domain',
             '/api/batch': 'POST - Batch analysis',
+            '/api/batch/stream': 'POST - Batch analysis of any size (NDJSON or text lines in, NDJSON out)',
+            '/api/geo/<ip>': 'GET - Offline ASN/country lookup',
             '/api/stats': 'GET - System statistics'
         },
         'status': 'online' if CORE_AVAILABLE else 'core_unavailable'
@@ -65,6 +100,8 @@ def analyze_ip(ip_address):
         full_analysis = (mode.lower() == 'full')
         
         result = insight.analyze_ip(ip_address, full_analysis)
+        if geo_index:
+            apply_geo_enrichment(result, geo_index.lookup(ip_address))
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -92,22 +129,143 @@ def batch_analysis():
         entities = data.get('entities', [])
         results = []
         
-        for entity in entities[:10]:  # Limit to 10 per batch
-            if entity.get('type') == 'ip':
-                result = insight.analyze_ip(entity.get('value'), full_analysis=False)
-                results.append({
-                    'entity': entity.get('value'),
-                    'type': 'ip',
-                    'threat_score': result.get('risk_assessment', {}).get('threat_score', 0),
-                    'risk_level': result.get('risk_assessment', {}).get('risk_level', 'unknown'),
-                    'country': result.get('geolocation', {}).get('country', 'Unknown'),
-                    'isp': result.get('network', {}).get('isp', 'Unknown')
-                })
+        entities = entities[:10]  # Limit to 10 per batch (see /api/batch/stream)
+        results = [r for r in analyze_entities(entities) if r['type'] == 'ip']
         
         return jsonify({'results': results, 'count': len(results)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def analyze_entities(entities):
+    """Batch results for entities; IPs are geo-looked-up in one call
+    
+    An entity whose analysis raises gets an error row (failed=True)
+    instead of aborting the batch.
+    """
+    ip_values = [e.get('value') for e in entities if e.get('type') == 'ip']
+    try:
+        geo_records = dict(zip(ip_values, geo_index.lookup_batch(ip_values))) if geo_index else {}
+    except Exception as e:
+        print(f"⚠️  Geo lookup failed: {e}")
+        geo_records = {}
+    results = []
+    for entity in entities:
+        if entity.get('type') != 'ip':
+            results.append({'entity': entity.get('value'), 'type': entity.get('type'),
+                             'error': 'unsupported entity type'})
+            continue
+        try:
+            result = insight.analyze_ip(entity.get('value'), full_analysis=False)
+            apply_geo_enrichment(result, geo_records.get(entity.get('value')))
+        except Exception as e:
+            results.append({'entity': entity.get('value'), 'type': 'ip',
+                            'error': str(e)[:200], 'failed': True})
+            continue
+        results.append({
+            'entity': entity.get('value'),
+            'type': 'ip',
+            'threat_score': result.get('risk_assessment', {}).get('threat_score', 0),
+            'risk_level': result.get('risk_assessment', {}).get('risk_level', 'unknown'),
+            'country': result.get('geolocation', {}).get('country', 'Unknown'),
+            'isp': result.get('network', {}).get('isp', 'Unknown')
+        })
+    return results
+
+def body_lines(stream, limit=MAX_LINE_BYTES):
+    """Lines of a request body, read at most limit bytes at a time
+    
+    A line longer than limit is consumed up to its newline and yielded
+    as None (invalid), so one huge line can't be buffered whole.
+    """
+    while True:
+        line = stream.readline(limit + 1)
+        if not line:
+            return
+        if len(line) > limit:
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(limit + 1)
+            yield None
+            continue
+        yield line
+
+def stream_entities(lines):
+    """Entities from NDJSON ({"type", "value"} or "...") or plain-text lines
+    
+    None lines (see body_lines) and malformed JSON yield None.
+    """
+    for raw in lines:
+        if raw is None:
+            yield None
+            continue
+        line = raw.decode('utf-8', 'replace').strip() if isinstance(raw, bytes) else raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        entity_type = None
+        if line[0] in '{"':
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            if isinstance(item, dict):
+                entity_type = item.get('type')
+                line = item.get('value') or item.get('ioc')
+            else:
+                line = item
+            if not isinstance(line, str) or not line.strip():
+                yield None
+                continue
+        if entity_type is None:
+            line, entity_type = classify(line) if classify else (line.strip(), 'ip')
+        yield {'type': entity_type, 'value': line.strip()}
+
+@app.route('/api/batch/stream', methods=['POST'])
+def batch_stream():
+    """Batch analysis of a request body of any length, streamed back as NDJSON
+    
+    The body is read line by line (lines over MAX_LINE_BYTES are skipped)
+    and analyzed STREAM_CHUNK entities at a time; each chunk's results are
+    written out before the next is read, so memory stays constant. An
+    entity that fails gets an error row. The last line is {"summary": ...}.
+    """
+    if not CORE_AVAILABLE:
+        return jsonify({'error': 'ThreatInsight core not available'}), 500
+    
+    def generate():
+        stats = {'received': 0, 'analyzed': 0, 'unsupported': 0, 'errors': 0, 'invalid_lines': 0}
+        chunk = []
+        
+        def flush():
+            for result in analyze_entities(chunk):
+                if result.get('failed'):
+                    stats['errors'] += 1
+                elif 'error' in result:
+                    stats['unsupported'] += 1
+                else:
+                    stats['analyzed'] += 1
+                yield json.dumps(result) + '\n'
+            chunk.clear()
+        
+        for entity in stream_entities(body_lines(request.stream)):
+            if entity is None:
+                stats['invalid_lines'] += 1
+                continue
+            stats['received'] += 1
+            chunk.append(entity)
+            if len(chunk) >= STREAM_CHUNK:
+                yield from flush()
+        yield from flush()
+        yield json.dumps({'summary': stats}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/geo/<ip_address>')
+def geo_lookup(ip_address):
+    """Offline ASN/country lookup"""
+    if not geo_index:
+        return jsonify({'error': 'Geo index not built (run geo_index.py build <dump>)'}), 503
+    return jsonify(dict(geo_index.lookup(ip_address), ip=ip_address, source=geo_index.source))
+
 @app.route('/api/stats')
 def get_stats():
     """Get system statistics"""
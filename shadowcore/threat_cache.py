@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory threat cache for ShadowCore orchestrators
+
+The clean feed cache is ~49k IOCs, each a small dict that repeats the same
+type/source/threat_level strings and the same generation timestamp. Holding
+those dicts in every worker costs hundreds of bytes per IOC. This module
+stores the cache column-wise instead:
+
+  * type, source, threat_level and timestamp are interned into small string
+    tables and stored as array-backed integer codes
+  * port and malware are array-backed columns (malware as a table index)
+  * anything else an entry carries is kept in a sparse per-row side table
+
+CompactThreatCache is a read-only Mapping, so existing callers that do
+`ioc in cache`, `cache[ioc]`, `cache.get(ioc)` or iterate `.values()` keep
+working unchanged. Each lookup returns a fresh dict.
+"""
+import json
+import os
+import sys
+from array import array
+from collections.abc import Mapping
+
+# Column order matches the dicts written by CleanFeedManager.create_cache
+CORE_FIELDS = ('type', 'source', 'threat_level', 'timestamp')
+NO_PORT = -1
+NO_MALWARE = 0
+
+
+class StringTable:
+    """Interns repeated column values into small integer codes"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        """Get (or assign) the code for a value"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value) if isinstance(value, str) else value
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CompactThreatCache(Mapping):
+    """Read-only, columnar threat cache keyed by IOC"""
+
+    def __init__(self, entries=None, generation=None):
+        self._rows = {}
+        self._tables = {field: StringTable() for field in CORE_FIELDS}
+        # Per-IOC timestamps can be unique in older caches, so give them room
+        self._columns = {field: array('I' if field == 'timestamp' else 'H') for field in CORE_FIELDS}
+        self._malware = StringTable()
+        self._malware.code(None)  # code 0 == no malware recorded
+        self._malware_codes = array('I')
+        self._ports = array('i')
+        self._int_ports = set()
+        self._extras = {}
+        self.generation = generation
+
+        if entries:
+            for ioc, entry in entries.items():
+                self._append(ioc, entry)
+        self._finalize()
+
+    @classmethod
+    def load(cls, cache_file):
+        """Load a threat_cache JSON file into the compact layout"""
+        with open(cache_file) as f:
+            return cls(json.load(f))
+
+    def _append(self, ioc, entry):
+        """Append one IOC entry as a new row"""
+        row = len(self._ports)
+        self._rows[sys.intern(ioc)] = row
+
+        for field in CORE_FIELDS:
+            value = entry.get(field)
+            if field == 'timestamp' and value is None:
+                value = self.generation
+            self._columns[field].append(self._tables[field].code(value))
+
+        malware = entry.get('malware')
+        self._malware_codes.append(self._malware.code(malware) if malware is not None else NO_MALWARE)
+
+        port = entry.get('port')
+        extras = {k: v for k, v in entry.items() if k not in CORE_FIELDS and k not in ('malware', 'port')}
+        if port is None:
+            self._ports.append(NO_PORT)
+        elif isinstance(port, (int, str)) and str(port).isdigit() and int(port) <= 65535:
+            # Feeds write ports as strings; remember the rare int ones
+            self._ports.append(int(port))
+            if isinstance(port, int):
+                self._int_ports.add(row)
+        else:
+            # Odd port values (ranges, blanks) stay exact in the side table
+            self._ports.append(NO_PORT)
+            extras['port'] = port
+
+        if extras:
+            self._extras[row] = extras
+
+    def _finalize(self):
+        """Derive the generation timestamp once rows are loaded"""
+        timestamps = [t for t in self._tables['timestamp'].values if t]
+        if self.generation is None and timestamps:
+            self.generation = max(timestamps)
+
+    def _row_to_dict(self, row):
+        """Rebuild the original entry dict for a row"""
+        entry = {}
+        for field in CORE_FIELDS:
+            value = self._tables[field].values[self._columns[field][row]]
+            if value is not None:
+                entry[field] = value
+
+        malware_code = self._malware_codes[row]
+        if malware_code != NO_MALWARE:
+            entry['malware'] = self._malware.values[malware_code]
+
+        port = self._ports[row]
+        if port != NO_PORT:
+            entry['port'] = port if row in self._int_ports else str(port)
+
+        extras = self._extras.get(row)
+        if extras:
+            entry.update(extras)
+        return entry
+
+    # Mapping API
+
+    def __getitem__(self, ioc):
+        return self._row_to_dict(self._rows[ioc])
+
+    def __contains__(self, ioc):
+        return ioc in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    # Column accessors for callers that don't need a full dict
+
+    def field(self, ioc, name, default=None):
+        """Get a single field for an IOC without rebuilding the entry"""
+        row = self._rows.get(ioc)
+        if row is None:
+            return default
+        if name in self._tables:
+            value = self._tables[name].values[self._columns[name][row]]
+            return default if value is None else value
+        return self._row_to_dict(row).get(name, default)
+
+    def stats(self):
+        """Column/table sizes for monitoring"""
+        return {
+            'iocs': len(self._rows),
+            'generation': self.generation,
+            'interned': {field: len(table) for field, table in self._tables.items()},
+            'malware_families': len(self._malware) - 1,
+            'sparse_rows': len(self._extras),
+        }
+
+
+def load_threat_cache(*cache_files):
+    """Load the first readable cache file as a CompactThreatCache"""
+    for cache_file in cache_files:
+        if os.path.exists(cache_file):
+            try:
+                return cache_file, CompactThreatCache.load(cache_file)
+            except Exception as e:
+                print(f"  ❌ Error loading cache {cache_file}: {e}")
+    return None, CompactThreatCache()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing and latency histograms for the IOC pipeline
+
+    from tracing import tracer
+
+    with tracer.span("neo4j_lookup", kind="dependency"):
+        ...
+
+    @tracer.traced("ai_analyze")
+    async def _ai_analyze(...): ...
+
+Spans propagate through contextvars, so nested spans (including ones
+opened in concurrently running asyncio tasks) attach to the right parent.
+Every span feeds a per-(kind, name) latency histogram. Full span trees are
+kept only for sampled traces and appended to a JSON-lines trace file, so
+with a low sample rate the per-span cost is a perf_counter call and a
+bucket increment.
+
+Exports:
+    tracer.render_prometheus()        Prometheus text exposition
+    start_metrics_server(port)        /metrics on a local HTTP port
+    tracer.flush()                    write buffered sampled traces
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+
+SAMPLE_RATE = float(os.environ.get('SHADOWCORE_TRACE_SAMPLE', '0.01'))
+TRACE_FILE = os.environ.get('SHADOWCORE_TRACE_FILE', '/opt/shadowcore/logs/traces.jsonl')
+METRICS_PORT = int(os.environ.get('SHADOWCORE_METRICS_PORT', '9464'))
+
+# Seconds - covers cache hits (~50µs) through dependency timeouts (5s)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_span = contextvars.ContextVar('shadowcore_span', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing quantile q"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Span:
+    """One timed operation inside a trace"""
+
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent', 'sampled',
+                 'attrs', 'start', 'duration', 'children', 'error', '_token')
+
+    def __init__(self, name, kind, parent, sampled, attrs):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.sampled = sampled
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else (os.urandom(16).hex() if sampled else None)
+        self.span_id = os.urandom(8).hex() if sampled else None
+        self.children = [] if sampled else None
+        self.error = None
+        self.duration = None
+        self.start = 0.0
+        self._token = None
+
+    def set(self, **attrs):
+        """Attach attributes (kept only for sampled traces)"""
+        if self.sampled:
+            self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'span_id': self.span_id,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attrs': self.attrs,
+            'error': self.error,
+            'children': [c.to_dict() for c in self.children],
+        }
+
+
+class _SpanContext:
+    """Context manager returned by Tracer.span (works in sync and async code)"""
+
+    __slots__ = ('tracer', 'name', 'kind', 'attrs', 'span')
+
+    def __init__(self, tracer, name, kind, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.span = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        sampled = parent.sampled if parent else (random.random() < self.tracer.sample_rate)
+        span = Span(self.name, self.kind, parent, sampled, self.attrs)
+        span._token = _current_span.set(span)
+        span.start = time.perf_counter()
+        self.span = span
+        return span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.duration = time.perf_counter() - span.start
+        _current_span.reset(span._token)
+        if exc_type is not None:
+            span.error = exc_type.__name__
+        self.tracer._finish(span)
+        return False
+
+
+class Tracer:
+    """Span factory plus histogram registry and exporters"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, trace_file=TRACE_FILE):
+        self.sample_rate = sample_rate
+        self.trace_file = trace_file
+        self.histograms = {}
+        self.errors = {}
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def span(self, name, kind='stage', **attrs):
+        """Open a span: `with tracer.span("redis_get", kind="dependency"):`"""
+        return _SpanContext(self, name, kind, attrs)
+
+    def traced(self, name=None, kind='stage'):
+        """Decorator wrapping a sync or async function in a span"""
+        def decorator(fn):
+            span_name = name or fn.__name__
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name, kind):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, kind):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _finish(self, span):
+        """Record a finished span"""
+        key = (span.kind, span.name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(span.duration)
+        if span.error:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+        if not span.sampled:
+            return
+        if span.parent is not None:
+            span.parent.children.append(span)
+            return
+        trace = dict(span.to_dict(), trace_id=span.trace_id, timestamp=time.time())
+        with self._lock:
+            self._buffer.append(trace)
+            should_flush = len(self._buffer) >= 50
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Append buffered sampled traces to the JSON-lines trace file"""
+        with self._lock:
+            traces, self._buffer = self._buffer, []
+        if not traces or not self.trace_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.trace_file), exist_ok=True)
+            with open(self.trace_file, 'a') as f:
+                for trace in traces:
+                    f.write(json.dumps(trace, default=str) + '\n')
+        except OSError:
+            pass
+
+    def summary(self):
+        """p50/p95/p99 (bucket bounds) per stage and dependency"""
+        return {
+            f"{kind}:{name}": {
+                'count': h.count,
+                'avg_ms': round(h.total / h.count * 1000, 3) if h.count else 0.0,
+                'p50_ms': h.quantile(0.5) * 1000,
+                'p95_ms': h.quantile(0.95) * 1000,
+                'p99_ms': h.quantile(0.99) * 1000,
+                'errors': self.errors.get((kind, name), 0),
+            } for (kind, name), h in sorted(self.histograms.items())
+        }
+
+    def render_prometheus(self):
+        """Histograms in Prometheus text exposition format"""
+        lines = [
+            '# HELP shadowcore_span_seconds Latency of pipeline stages and dependency calls',
+            '# TYPE shadowcore_span_seconds histogram',
+        ]
+        for (kind, name), h in sorted(self.histograms.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                lines.append(f'shadowcore_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'shadowcore_span_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f'shadowcore_span_seconds_sum{{{labels}}} {h.total:.6f}')
+            lines.append(f'shadowcore_span_seconds_count{{{labels}}} {h.count}')
+        lines.append('# HELP shadowcore_span_errors_total Spans that ended with an exception')
+        lines.append('# TYPE shadowcore_span_errors_total counter')
+        for (kind, name), n in sorted(self.errors.items()):
+            lines.append(f'shadowcore_span_errors_total{{kind="{kind}",name="{name}"}} {n}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide tracer used by the orchestrators
+tracer = Tracer()
+atexit.register(tracer.flush)
+
+_metrics_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host='127.0.0.1'):
+    """Serve tracer.render_prometheus() on http://host:port/metrics"""
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    # Imported here so importing tracing stays cheap for one-shot CLIs
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('/metrics', ''):
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
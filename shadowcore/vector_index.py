@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+ShadowCore vector index - local similarity search without Qdrant
+
+HashingEmbedder turns text into a fixed-size float32 vector by hashing
+character 3-5-grams and word tokens into signed buckets, then L2-normalising
+it. It needs no model or training, always gives the same output for the
+same text, and strings that share substrings (sibling domains, neighbouring
+IPs, malware names) end up with a high cosine similarity.
+
+VectorIndex keeps the normalised vectors as one float32 matrix:
+
+  /opt/shadowcore/vectors/threats.f32    raw rows, count x dim, memory-mapped
+  /opt/shadowcore/vectors/threats.json   dim, ids and payloads
+
+A search is one matrix-vector product plus an argpartition for the top k.
+search_batch() scores many queries with one matrix-matrix product.
+points_search() accepts and returns the same JSON as Qdrant's
+POST /collections/threats/points/search, so callers can switch over
+without changes.
+
+Usage:
+    python3 vector_index.py build            # index the clean threat cache
+    python3 vector_index.py search evil-traffic.com
+    python3 vector_index.py stats
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+INDEX_PATH = "/opt/shadowcore/vectors/threats"
+DIM = 128
+NGRAMS = (3, 4, 5)
+
+
+@lru_cache(maxsize=1 << 16)
+def _slot(feature, dim):
+    """(bucket, sign) for one feature; crc32 is stable across processes"""
+    h = zlib.crc32(feature.encode())
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic char-n-gram / token feature hashing"""
+
+    def __init__(self, dim=DIM, ngrams=NGRAMS):
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+
+    def features(self, text):
+        text = ' '.join(str(text).lower().split())
+        padded = f" {text} "
+        for n in self.ngrams:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+        token = []
+        for ch in text:
+            if ch.isalnum():
+                token.append(ch)
+            elif token:
+                yield 'w:' + ''.join(token)
+                token = []
+        if token:
+            yield 'w:' + ''.join(token)
+
+    def embed(self, text):
+        """Unit-length float32 vector for text (all zeros for empty text)"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            bucket, sign = _slot(feature, self.dim)
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts):
+        """(len(texts), dim) float32 matrix of unit rows"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+def threat_text(ioc, record=None):
+    """Text embedded for an IOC: the value plus its feed context"""
+    record = record or {}
+    parts = [str(ioc)]
+    for field in ('type', 'malware', 'source', 'threat_level'):
+        value = record.get(field)
+        if value:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+class VectorIndex:
+    """Normalised float32 matrix with id/payload metadata and top-k search"""
+
+    def __init__(self, path=INDEX_PATH, dim=DIM, embedder=None):
+        self.path = path
+        self.dim = dim
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids = []
+        self.payloads = []
+        self.rows = {}
+        self._writable = True
+
+    # ----- persistence ---------------------------------------------------
+
+    @classmethod
+    def load(cls, path=INDEX_PATH, embedder=None):
+        """Open a saved index; the matrix is memory-mapped read-only"""
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        index = cls(path, meta['dim'], embedder or HashingEmbedder(meta['dim']))
+        count = len(meta['ids'])
+        if count:
+            index.matrix = np.memmap(path + '.f32', dtype=np.float32, mode='r', shape=(count, meta['dim']))
+            index._writable = False
+        index.ids = meta['ids']
+        index.payloads = meta['payloads']
+        index.rows = {point_id: row for row, point_id in enumerate(index.ids)}
+        return index
+
+    def save(self):
+        """Write matrix and metadata atomically (tmp file + rename)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.f32.tmp', 'wb') as f:
+            f.write(np.ascontiguousarray(self.matrix, dtype=np.float32).tobytes())
+        with open(self.path + '.json.tmp', 'w') as f:
+            json.dump({'dim': self.dim, 'ids': self.ids, 'payloads': self.payloads}, f)
+        os.replace(self.path + '.f32.tmp', self.path + '.f32')
+        os.replace(self.path + '.json.tmp', self.path + '.json')
+
+    # ----- writes --------------------------------------------------------
+
+    def upsert(self, points):
+        """Insert or replace Qdrant-style points [{'id', 'vector', 'payload'}]
+
+        Vectors are normalised on the way in. Returns the number of points.
+        """
+        points = list(points)
+        if not points:
+            return 0
+        if not self._writable:
+            self.matrix = np.array(self.matrix)
+            self._writable = True
+        vectors = np.asarray([p['vector'] for p in points], dtype=np.float32).reshape(len(points), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+
+        stored = len(self.matrix)
+        new_rows = []
+        for point, vector in zip(points, vectors):
+            row = self.rows.get(point['id'])
+            if row is None:
+                self.rows[point['id']] = len(self.ids)
+                new_rows.append(vector)
+                self.ids.append(point['id'])
+                self.payloads.append(point.get('payload', {}))
+                continue
+            if row < stored:
+                self.matrix[row] = vector
+            else:
+                new_rows[row - stored] = vector
+            self.payloads[row] = point.get('payload', {})
+        if new_rows:
+            self.matrix = np.concatenate([self.matrix, np.vstack(new_rows)])
+        return len(points)
+
+    def add_texts(self, items):
+        """Embed and upsert [(id, text, payload)]"""
+        items = list(items)
+        vectors = self.embedder.embed_batch([text for _, text, _ in items])
+        return self.upsert({'id': point_id, 'vector': vector, 'payload': payload}
+                           for (point_id, _, payload), vector in zip(items, vectors))
+
+    # ----- queries -------------------------------------------------------
+
+    def _top(self, scores, limit, score_threshold):
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            'id': self.ids[row],
+            'version': 0,
+            'score': round(float(scores[row]), 4),
+            'payload': self.payloads[row],
+        } for row in top if score_threshold is None or scores[row] >= score_threshold]
+
+    def search(self, vector, limit=3, score_threshold=None):
+        """Top-limit points by cosine similarity, best first"""
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        return self._top(self.matrix @ query, limit, score_threshold)
+
+    def search_batch(self, vectors, limit=3, score_threshold=None):
+        """search() for many query vectors with one matrix product"""
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not self.ids:
+            return [[] for _ in queries]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+        scores = queries @ self.matrix.T
+        return [self._top(row, limit, score_threshold) for row in scores]
+
+    def search_text(self, text, limit=3, score_threshold=None):
+        return self.search(self.embedder.embed(text), limit, score_threshold)
+
+    def search_texts(self, texts, limit=3, score_threshold=None):
+        """search_text() for many texts with one matrix product"""
+        return self.search_batch([self.embedder.embed(text) for text in texts], limit, score_threshold)
+
+    def points_search(self, body):
+        """Qdrant POST /collections/{name}/points/search, served in-process"""
+        start = time.perf_counter()
+        result = self.search(body['vector'], body.get('limit', 10), body.get('score_threshold'))
+        if not body.get('with_payload', True):
+            for point in result:
+                point.pop('payload')
+        return {'result': result, 'status': 'ok', 'time': round(time.perf_counter() - start, 6)}
+
+    def stats(self):
+        return {
+            'points': len(self.ids),
+            'dim': self.dim,
+            'bytes': int(self.matrix.nbytes),
+            'memory_mapped': isinstance(self.matrix, np.memmap),
+        }
+
+
+def build_threat_index(path=INDEX_PATH, extra=()):
+    """Index every IOC in the clean threat cache (plus extra (id, text, payload))"""
+    from threat_cache import load_threat_cache
+
+    _, cache = load_threat_cache(
+        "/opt/shadowcore/feeds/clean/threat_cache_clean.json",
+        "/opt/shadowcore/feeds/processed/threat_cache.json",
+    )
+    index = VectorIndex(path)
+    items = [(ioc, threat_text(ioc, cache[ioc]), dict(cache[ioc], ioc=ioc)) for ioc in cache]
+    index.add_texts(items + list(extra))
+    index.save()
+    return index
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_vector_index():
+    """Shared per-process index (empty until built)"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            try:
+                _shared_index = VectorIndex.load()
+            except (OSError, ValueError):
+                _shared_index = VectorIndex()
+        return _shared_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ShadowCore vector index')
+    parser.add_argument('--path', default=INDEX_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build')
+    sub.add_parser('stats')
+    search = sub.add_parser('search')
+    search.add_argument('text')
+    search.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = build_threat_index(args.path)
+        print(f"Indexed {len(index.ids)} points in {time.perf_counter() - start:.2f}s -> {args.path}.f32")
+    elif args.command == 'stats':
+        print(json.dumps(VectorIndex.load(args.path).stats(), indent=2))
+    elif args.command == 'search':
+        for point in VectorIndex.load(args.path).search_text(args.text, args.limit):
+            print(f"{point['score']:.4f}  {point['id']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Write-behind persistence for analysis results
+
+process_ioc hands finished reports to a WriteBehindQueue instead of writing
+them inline. A background task drains the queue in batches:
+
+  * Redis   - one non-transactional pipeline of SETEX commands per batch
+  * Neo4j   - one UNWIND ... MERGE upsert per batch (graph_store)
+  * reports - one compressed block appended to the report store per batch
+
+The queue is bounded: when storage falls behind, submit() waits for room
+(backpressure) rather than letting memory grow. Callers on a deadline use
+submit_nowait(), which drops (and counts) the result instead of waiting.
+close() flushes everything still queued.
+
+Durability modes:
+  'buffered'  submit() returns once queued; a crash loses unflushed results
+  'journal'   each result is appended to a local journal first and replayed
+              on the next start if it was never flushed; a store that fails
+              gets the failed results again with every later flush (every
+              retry_interval when idle) until it takes them, and the journal
+              is truncated once nothing journaled is left unwritten
+  'sync'      submit() waits until the batch holding the result is written
+"""
+import asyncio
+import json
+import os
+import time
+from graph_store import graph_row, upsert_iocs
+from report_store import ReportStore
+from tracing import tracer
+
+JOURNAL_FILE = "/opt/shadowcore/logs/write_behind.journal"
+DURABILITY_MODES = ('buffered', 'journal', 'sync')
+RETRY_INTERVAL = 1.0
+
+
+class WriteJob:
+    """One analysis result waiting to be persisted"""
+
+    __slots__ = ('ioc', 'report', 'ttl', 'graph', 'done')
+
+    def __init__(self, ioc, report, ttl=3600, graph=False, done=None):
+        self.ioc = ioc
+        self.report = report
+        self.ttl = ttl
+        self.graph = graph
+        self.done = done
+
+    def to_dict(self):
+        return {'ioc': self.ioc, 'report': self.report, 'ttl': self.ttl, 'graph': self.graph}
+
+
+class WriteBehindQueue:
+    """Bounded queue drained into Redis, Neo4j and report files in batches"""
+
+    def __init__(self, redis, neo4j_driver, report_store=None, max_pending=10000,
+                 batch_size=256, flush_interval=0.05, durability='buffered',
+                 journal_file=JOURNAL_FILE, fsync=False, retry_interval=RETRY_INTERVAL):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.redis = redis
+        self.neo4j_driver = neo4j_driver
+        self.report_store = report_store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.journal_file = journal_file
+        self.fsync = fsync
+        self.retry_interval = retry_interval
+        self.max_retry = max_pending
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.stats = {'submitted': 0, 'flushed': 0, 'batches': 0, 'max_batch': 0,
+                      'errors': 0, 'dropped': 0, 'replayed': 0, 'retried': 0, 'retry_dropped': 0, 'backpressure_waits': 0,
+                      'graph_created': 0, 'graph_existing': 0}
+        self._worker = None
+        self._journal = None
+        self._journal_clean = True
+        self._journal_lost = False
+        self._retry = {}
+        self._replay = []
+        self._closed = False
+
+    def start(self):
+        """Start the background writer (and replay the journal) on the running loop"""
+        if self._worker is None:
+            if self.durability == 'journal':
+                self._open_journal()
+            self._worker = asyncio.ensure_future(self._run())
+        return self
+
+    async def submit(self, ioc, report, ttl=3600, graph=False):
+        """Queue one result (ttl 0 = don't cache it); waits for room when the queue is full"""
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        self.start()
+        done = asyncio.get_running_loop().create_future() if self.durability == 'sync' else None
+        job = WriteJob(ioc, report, ttl, graph, done)
+        if self._journal is not None:
+            self._journal_append(job)
+        if self.queue.full():
+            self.stats['backpressure_waits'] += 1
+        await self.queue.put(job)
+        self.stats['submitted'] += 1
+        if done is not None:
+            await done
+
+    def submit_nowait(self, ioc, report, ttl=3600, graph=False):
+        """Queue one result without waiting; False (and counted) if the queue is full
+
+        Never waits for room or, in 'sync' mode, for the write itself.
+        """
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        self.start()
+        if self.queue.full():
+            self.stats['dropped'] += 1
+            return False
+        job = WriteJob(ioc, report, ttl, graph)
+        if self._journal is not None:
+            self._journal_append(job)
+        self.queue.put_nowait(job)
+        self.stats['submitted'] += 1
+        return True
+
+    async def close(self):
+        """Flush everything queued, then stop the writer"""
+        self._closed = True
+        if self._worker is not None:
+            await self.queue.join()
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._retry:
+            await self._flush([])  # last try; whatever still fails stays journaled
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def snapshot(self):
+        return dict(self.stats, pending=self.pending(), durability=self.durability,
+                    retrying={store: len(jobs) for store, jobs in self._retry.items()})
+
+    async def _run(self):
+        if self._replay:
+            replay, self._replay = self._replay, []
+            for i in range(0, len(replay), self.batch_size):
+                await self._flush(replay[i:i + self.batch_size], replaying=i + self.batch_size < len(replay))
+        while True:
+            if self._retry:
+                try:
+                    batch = [await asyncio.wait_for(self.queue.get(), self.retry_interval)]
+                except asyncio.TimeoutError:
+                    await self._flush([])  # idle: retry the failed writes on their own
+                    continue
+            else:
+                batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch, replaying=False):
+        """Write one batch to every store; failures are counted, not raised"""
+        ok = True
+        with tracer.span("write_behind_flush", kind="dependency", size=len(batch)):
+            for write in (self._write_redis, self._write_graph, self._write_reports):
+                store = write.__name__[7:]
+                retry = self._retry.pop(store, [])
+                self.stats['retried'] += len(retry)
+                jobs = retry + batch if retry else batch
+                if not jobs:
+                    continue
+                try:
+                    await write(jobs)
+                except Exception as e:
+                    ok = False
+                    self.stats['errors'] += 1
+                    print(f"   ❌ Write-behind {store} failed: {str(e)[:80]}")
+                    if self._journal is not None:
+                        self._keep_for_retry(store, jobs)
+
+        if batch:
+            self.stats['batches'] += 1
+            self.stats['flushed'] += len(batch)
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        for job in batch:
+            if job.done is not None and not job.done.done():
+                job.done.set_result(ok)
+
+        if self._journal is not None:
+            # Clean again once every store has taken every journaled result
+            self._journal_clean = not self._retry and not self._journal_lost
+            if self.queue.empty() and self._journal_clean and not replaying:
+                # Everything journaled so far is persisted
+                self._journal.seek(0)
+                self._journal.truncate()
+
+    def _keep_for_retry(self, store, jobs):
+        """Hold a store's failed writes for the next flush (bounded)"""
+        overflow = len(jobs) - self.max_retry
+        if overflow > 0:
+            # Still in the journal: keep it until a restart replays it
+            jobs = jobs[overflow:]
+            self.stats['retry_dropped'] += overflow
+            self._journal_lost = True
+        self._retry[store] = jobs
+
+    async def _write_redis(self, batch):
+        jobs = [job for job in batch if job.ttl > 0]
+        if not jobs:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.setex(f"analysis:{job.ioc}", job.ttl, json.dumps(job.report))
+            await pipe.execute()
+
+    async def _write_graph(self, batch):
+        rows = [graph_row(job.ioc, job.report) for job in batch if job.graph]
+        summary = await upsert_iocs(self.neo4j_driver, rows)
+        created = sum(1 for s in summary.values() if s['created'])
+        self.stats['graph_created'] += created
+        self.stats['graph_existing'] += len(summary) - created
+
+    async def _write_reports(self, batch):
+        if self.report_store is None:
+            self.report_store = ReportStore()
+        reports = [job.report for job in batch]
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.report_store.append, reports, self.fsync)
+
+    def _open_journal(self):
+        """Re-queue results a previous process journaled but never flushed"""
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        self._journal = open(self.journal_file, 'a+')
+        self._journal.seek(0)
+        replay = []
+        for line in self._journal:
+            try:
+                replay.append(WriteJob(**json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+        self._replay = replay
+        self.stats['replayed'] = len(replay)
+
+    def _journal_append(self, job):
+        self._journal.write(json.dumps(job.to_dict()) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())